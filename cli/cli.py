@@ -1,7 +1,9 @@
 # cli.py
 import typer
-import requests
 import json
+import time
+import uuid
+from enum import Enum
 from pathlib import Path
 from typing_extensions import Annotated
 from rich.console import Console
@@ -12,6 +14,22 @@ console = Console()
 
 CONFIG_FILE = Path("config.json")
 
+# Shared keep-alive session, created on first use so commands that never
+# touch the network don't pay for importing requests.
+_session = None
+
+def get_session(pool_size: int = 16):
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
 class AppConfig:
     def __init__(self, server_url: str, server_port: int, token: str | None = None):
         self.server_url = server_url
@@ -62,6 +80,600 @@ def setup_interactive_config() -> AppConfig:
     save_config(config)
     return config
 
+AUDIO_MIME = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".opus": "audio/ogg",
+    ".ogg": "audio/ogg",
+}
+
+class Codec(str, Enum):
+    opus = "opus"
+    flac = "flac"
+
+# The server resamples everything to 16 kHz mono, so anything above that is wasted upload
+CODEC_ARGS = {
+    Codec.opus: ["-c:a", "libopus", "-b:a", "32k"],
+    Codec.flac: ["-c:a", "flac", "-sample_fmt", "s16"],
+}
+
+def audio_mime(audio_file: Path) -> str:
+    return AUDIO_MIME.get(audio_file.suffix.lower(), "application/octet-stream")
+
+def transcode(audio_file: Path, codec: Codec, output_dir: str) -> Path:
+    """ Transcodes to 16 kHz mono with ffmpeg, returns the path of the compressed file """
+    import shutil
+    import subprocess
+
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg is required for --compress")
+
+    output = Path(output_dir) / f"{audio_file.stem}.{codec.value}"
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+        "-i", str(audio_file), "-ac", "1", "-ar", "16000",
+        *CODEC_ARGS[codec], str(output),
+    ]
+    with console.status(f"[bold cyan]Compressing to {codec.value}...[/bold cyan]"):
+        result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()}")
+
+    console.print(f"[bold cyan]Compressed:[/bold cyan] {audio_file.stat().st_size / 1e6:.1f} MB -> {output.stat().st_size / 1e6:.1f} MB")
+    return output
+
+class MultipartUpload:
+    """
+    A multipart/form-data body read from disk in fixed size chunks.
+    requests streams iterables with a length, so the file is never held in memory whole.
+    """
+
+    def __init__(self, audio_file: Path, fields: dict | None = None, on_chunk=None, chunk_size: int = 256 * 1024):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.audio_file = audio_file
+        self.on_chunk = on_chunk
+        self.chunk_size = chunk_size
+
+        head = "".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in (fields or {}).items()
+        )
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{audio_file.name}"\r\n'
+            f"Content-Type: {audio_mime(audio_file)}\r\n\r\n"
+        )
+        self.head = head.encode()
+        self.tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def __len__(self) -> int:
+        return len(self.head) + self.audio_file.stat().st_size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        with open(self.audio_file, "rb") as f:
+            while chunk := f.read(self.chunk_size):
+                if self.on_chunk:
+                    self.on_chunk(len(chunk))
+                yield chunk
+        yield self.tail
+
+def send_audio(config: "AppConfig", endpoint: str, audio_file: Path, data: dict | None = None, compress: Codec | None = None, stream: bool = False):
+    """ Uploads an audio file to an /audio endpoint, optionally compressed first, and returns the response """
+    import tempfile
+    from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn, TextColumn
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if compress:
+            audio_file = transcode(audio_file, compress, tmp)
+
+        columns = (TextColumn("[bold cyan]Uploading"), BarColumn(), DownloadColumn(), TransferSpeedColumn(), TimeRemainingColumn())
+        with Progress(*columns, console=console, transient=True) as progress:
+            body = MultipartUpload(audio_file, data)
+            task = progress.add_task("upload", total=len(body))
+            body.on_chunk = lambda n: progress.advance(task, n)
+            response = get_session().post(
+                f"{config.base_url}{endpoint}",
+                data=body,
+                headers={"Content-Type": body.content_type},
+                stream=stream,
+            )
+    response.raise_for_status()
+    return response
+
+def upload_audio(config: "AppConfig", endpoint: str, audio_file: Path, data: dict | None = None, compress: Codec | None = None) -> dict:
+    """ Uploads an audio file to an /audio endpoint and returns the JSON response """
+    return send_audio(config, endpoint, audio_file, data, compress).json()
+
+def print_transcript(result: dict) -> None:
+    if "transcript" in result:
+        console.print(f"[bold green]Transcript:[/bold green] {result['transcript']}")
+    else:
+        console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
+
+def print_transcribe_identify(result: dict) -> None:
+    if "transcript" in result and ("identified_speaker" in result or "speaker_segments" in result):
+        console.print(f"[bold green]Transcript:[/bold green] {result['transcript']}")
+        if "identified_speaker" in result:
+            console.print(f"[bold green]Identified Speaker:[/bold green] {result['identified_speaker']}")
+        if "path" in result:
+            console.print(f"[bold green]Speaker Path:[/bold green] {result['path'].replace('_', ' ')}")
+        for segment in result.get("speaker_segments", []):
+            console.print(f"[bold green]{segment['speaker']}[/bold green] [{segment['start']:.1f}s → {segment['end']:.1f}s] (conf: {segment['confidence']:.2f})")
+    else:
+        console.print(f"[bold red]Error from API or unexpected response:[/bold red] {result.get('error', 'Unknown error')}")
+
+def follow_job(config: "AppConfig", job_id: str) -> dict:
+    """ Shows a job's stage and progress from its event stream until it finishes, returns the final job """
+    from requests.exceptions import ConnectionError, ChunkedEncodingError, Timeout
+    from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn
+
+    columns = (TextColumn("[bold cyan]{task.fields[stage]}"), BarColumn(), TextColumn("{task.percentage:>3.0f}%"), TimeElapsedColumn())
+    job = None
+    with Progress(*columns, console=console, transient=True) as progress:
+        task = progress.add_task("job", total=1.0, stage="queued")
+        while job is None or job["status"] not in ("done", "failed"):
+            try:
+                with get_session().get(f"{config.base_url}/jobs/{job_id}/events", stream=True, timeout=(5, 60)) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith("data:"):
+                            job = json.loads(line[len("data:"):])
+                            progress.update(task, completed=job["progress"], stage=job["stage"])
+            except (ConnectionError, ChunkedEncodingError, Timeout):
+                # The job keeps running server side, reconnect and carry on
+                time.sleep(1)
+    return job
+
+def print_job(job: dict) -> None:
+    if job["status"] == "failed":
+        console.print(f"[bold red]Job failed:[/bold red] {job.get('error', 'Unknown error')}")
+    elif job["kind"] == "transcribe":
+        print_transcript(job["result"])
+    else:
+        print_transcribe_identify(job["result"])
+
+def run_job(config: "AppConfig", endpoint: str, audio_file: Path, compress: "Codec | None") -> None:
+    """ Submits a background job, then follows it to the result """
+    submitted = upload_audio(config, endpoint, audio_file, compress=compress)
+    if "job_id" not in submitted:
+        console.print(f"[bold red]Error from API:[/bold red] {submitted.get('detail', submitted.get('error', 'Unknown error'))}")
+        return
+    console.print(f"[bold cyan]Job submitted:[/bold cyan] {submitted['job_id']} (run `job {submitted['job_id']}` to reattach)")
+    print_job(follow_job(config, submitted["job_id"]))
+
+def print_message(result: dict) -> None:
+    if "message" in result:
+        console.print(f"[bold green]Success:[/bold green] {result['message']}")
+    else:
+        console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
+
+def save_tts(config: "AppConfig", text: str, output_path: Path) -> None:
+    response = get_session().post(f"{config.base_url}/audio/tts", params={"text": text}, stream=True)
+    response.raise_for_status()
+
+    with open(output_path, "wb") as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+    console.print(f"[bold green]TTS audio saved to:[/bold green] [yellow]{output_path.resolve()}[/yellow]")
+
+def stream_answer(config: "AppConfig", prompt: str) -> None:
+    """ Streams an answer from /messages/ask/stream to the console as it is generated """
+    with get_session().post(
+        f"{config.base_url}/messages/ask/stream",
+        json={"prompt": prompt, "token": config.token},
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+
+        # Errors are returned as JSON before any streaming starts
+        if response.headers.get("content-type", "").startswith("application/json"):
+            result = response.json()
+            console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
+            return
+
+        console.print("[bold green]AI:[/bold green] ", end="")
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            console.print(chunk, end="", markup=False, highlight=False, soft_wrap=True)
+        console.print()
+
+def retry_after(response, attempt: int) -> float:
+    """ Seconds to wait before retrying, from the Retry-After header or exponential backoff """
+    header = response.headers.get("Retry-After") if response is not None else None
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(60.0, 0.5 * 2 ** attempt)
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+def ask_with_retry(config: AppConfig, item: dict, max_retries: int, timeout: float) -> dict:
+    """ Sends one batch prompt, retrying on 429/503, timeouts and connection errors """
+    from requests.exceptions import RequestException, Timeout
+
+    session = get_session()
+    started = time.perf_counter()
+    result = {"id": item["id"]}
+    for attempt in range(max_retries + 1):
+        response = None
+        try:
+            response = session.post(
+                f"{config.base_url}/messages/ask",
+                json={"prompt": item["prompt"], "token": item.get("token") or config.token},
+                timeout=timeout,
+            )
+            if response.status_code not in (429, 503):
+                response.raise_for_status()
+                data = response.json()
+                if "message" in data:
+                    result.update(message=data["message"], backend=data.get("backend"))
+                else:
+                    result["error"] = data.get("error", "Unknown error")
+                break
+            error = f"HTTP {response.status_code}"
+        except Timeout:
+            # A stalled connection would otherwise hold its worker, and the batch, forever
+            error = f"Timed out after {timeout:g}s"
+        except RequestException as e:
+            error = str(e)
+            # Client errors other than rate limiting won't succeed on retry
+            if response is not None and 400 <= response.status_code < 500:
+                result["error"] = error
+                break
+
+        if attempt == max_retries:
+            result["error"] = error
+            break
+        time.sleep(retry_after(response, attempt))
+
+    result["attempts"] = attempt + 1
+    result["latency"] = round(time.perf_counter() - started, 4)
+    return result
+
+def load_batch(batch_file: Path) -> list:
+    """ Reads prompts from a JSONL file, each line has a prompt and optionally an id and token """
+    items = []
+    with open(batch_file, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if isinstance(data, str):
+                data = {"prompt": data}
+            data.setdefault("id", line_number)
+            items.append(data)
+    return items
+
+def read_results(output_file: Path) -> dict:
+    """ The last result per id in the output file, an id retried after an error has its error line first """
+    results = {}
+    if not output_file.exists():
+        return results
+    with open(output_file, "r") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                # Line cut off by an interruption
+                continue
+            results[data["id"]] = data
+    return results
+
+def compact_results(output_file: Path) -> dict:
+    """ Rewrites the output file with only the last line per id, replaced atomically so an interruption can't lose it """
+    results = read_results(output_file)
+    if not output_file.exists():
+        return results
+    temporary = output_file.with_name(output_file.name + ".tmp")
+    with open(temporary, "w") as f:
+        for result in results.values():
+            f.write(json.dumps(result) + "\n")
+    temporary.replace(output_file)
+    return results
+
+def completed_ids(output_file: Path) -> set:
+    """ IDs already answered successfully in a previous (possibly interrupted) run """
+    return {result_id for result_id, result in read_results(output_file).items() if "error" not in result}
+
+def run_batch(config: AppConfig, batch_file: Path, output_file: Path, concurrency: int, max_retries: int, timeout: float) -> None:
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from rich.progress import Progress
+
+    items = load_batch(batch_file)
+    done = completed_ids(output_file)
+    pending = [item for item in items if item["id"] not in done]
+    if done:
+        console.print(f"[bold yellow]Resuming:[/bold yellow] {len(items) - len(pending)} of {len(items)} prompts already answered in {output_file}")
+
+    get_session(pool_size=concurrency)
+    latencies = []
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        with open(output_file, "a") as out, Progress(console=console, transient=True) as progress:
+            task = progress.add_task("Asking", total=len(pending))
+            futures = [executor.submit(ask_with_retry, config, item, max_retries, timeout) for item in pending]
+            # Results are written in completion order and flushed so an interruption loses nothing
+            for future in as_completed(futures):
+                result = future.result()
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                if "error" not in result:
+                    latencies.append(result["latency"])
+                progress.advance(task)
+    except KeyboardInterrupt:
+        console.print("[bold yellow]Interrupted, rerun the same command to resume.[/bold yellow]")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    # Retries appended new lines after old errors, keep only the latest per id and count those
+    results = compact_results(output_file)
+    final = [results[item["id"]] for item in items if item["id"] in results]
+    failed = sum("error" in result for result in final)
+    console.print(
+        f"[bold green]Batch finished:[/bold green] {len(final) - failed} answered, {failed} failed, "
+        f"{len(items) - len(final)} not run of {len(items)} in {elapsed:.1f}s -> [yellow]{output_file}[/yellow]"
+    )
+    answered = len(latencies)
+    if answered:
+        # Timing covers this run only, answers from earlier runs weren't measured here
+        console.print(
+            f"[bold cyan]Throughput:[/bold cyan] {answered / elapsed:.2f} prompts/s  "
+            f"[bold cyan]Latency:[/bold cyan] mean {sum(latencies) / answered:.2f}s  "
+            f"p50 {percentile(latencies, 50):.2f}s  p90 {percentile(latencies, 90):.2f}s  "
+            f"p99 {percentile(latencies, 99):.2f}s  max {max(latencies):.2f}s"
+        )
+
+LOADTEST_FIXTURES = Path(__file__).parent / "fixtures" / "loadtest.jsonl"
+LOADTEST_KINDS = ("ask", "transcribe", "tts")
+
+def tone_wav(seconds: float) -> bytes:
+    """ A 16 kHz mono wav of a warbling tone, stands in for speech when a fixture has no recording """
+    import io
+    import math
+    import wave
+    from array import array
+
+    rate = 16000
+    samples = array("h", (
+        int(8000 * math.sin(2 * math.pi * (220 + 40 * math.sin(2 * math.pi * 3 * n / rate)) * n / rate))
+        for n in range(int(seconds * rate))
+    ))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+def load_fixtures(fixtures_file: Path) -> dict:
+    """
+    Reads load test requests from a JSONL file, grouped by kind:
+        {"kind": "ask", "prompt": "..."}
+        {"kind": "tts", "text": "..."}
+        {"kind": "transcribe", "file": "clip.mp3"}   relative to the fixtures file
+        {"kind": "transcribe", "seconds": 5}         a generated tone of that length
+    """
+    fixtures = {kind: [] for kind in LOADTEST_KINDS}
+    with open(fixtures_file, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            kind = data.get("kind")
+            if kind not in fixtures:
+                raise ValueError(f"line {line_number}: unknown kind {kind!r}, expected one of {', '.join(LOADTEST_KINDS)}")
+            if kind == "transcribe":
+                # Read once up front so the disk isn't part of what is measured
+                if "file" in data:
+                    audio_file = fixtures_file.parent / data["file"]
+                    data["filename"], data["audio"] = audio_file.name, audio_file.read_bytes()
+                else:
+                    data["filename"], data["audio"] = "tone.wav", tone_wav(float(data.get("seconds", 5)))
+            fixtures[kind].append(data)
+    return fixtures
+
+def parse_mix(mix: str) -> dict:
+    """ "ask=8,tts=1,transcribe=1" -> relative weights per kind """
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in LOADTEST_KINDS:
+            raise ValueError(f"unknown kind {kind!r} in mix, expected one of {', '.join(LOADTEST_KINDS)}")
+        weights[kind] = float(weight or 1)
+    return {kind: weight for kind, weight in weights.items() if weight > 0}
+
+def send_fixture(config: AppConfig, kind: str, fixture: dict, scheduled: float, timeout: float) -> dict:
+    """
+    Sends one load test request. Latency counts from when it was scheduled, not sent, so time
+    spent waiting for a free client thread shows up instead of hiding a saturated server.
+    """
+    from requests.exceptions import RequestException
+
+    session = get_session()
+    result = {"kind": kind}
+    try:
+        if kind == "ask":
+            response = session.post(
+                f"{config.base_url}/messages/ask",
+                json={"prompt": fixture["prompt"], "token": fixture.get("token") or config.token},
+                timeout=timeout,
+            )
+            ok = response.ok and "message" in response.json()
+        elif kind == "tts":
+            response = session.post(f"{config.base_url}/audio/tts", params={"text": fixture["text"]}, timeout=timeout)
+            ok = response.ok and len(response.content) > 0
+        else:
+            response = session.post(
+                f"{config.base_url}/audio/transcribe",
+                files={"file": (fixture["filename"], fixture["audio"], audio_mime(Path(fixture["filename"])))},
+                timeout=timeout,
+            )
+            ok = response.ok and "transcript" in response.json()
+
+        result["status"] = response.status_code
+        if not ok:
+            error = response.json().get("error") if response.ok else None
+            result["error"] = error or f"HTTP {response.status_code}"
+    except (RequestException, ValueError) as e:
+        # ValueError: a body that isn't JSON
+        result["error"] = type(e).__name__
+    result["latency"] = round(time.perf_counter() - scheduled, 4)
+    return result
+
+def run_load_step(config: AppConfig, fixtures: dict, weights: dict, duration: float, timeout: float,
+                  rate: float | None = None, concurrency: int | None = None, max_inflight: int = 256) -> tuple[list, float]:
+    """
+    Drives traffic for duration seconds, either open loop (Poisson arrivals at rate per second)
+    or closed loop (concurrency clients sending back to back). Returns the results and the wall time.
+    """
+    import random
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    rng = random.Random()
+    kinds, kind_weights = list(weights), list(weights.values())
+    results = []
+
+    def pick() -> tuple[str, dict]:
+        kind = rng.choices(kinds, kind_weights)[0]
+        return kind, rng.choice(fixtures[kind])
+
+    started = time.perf_counter()
+    deadline = started + duration
+    if concurrency:
+        def client():
+            while time.perf_counter() < deadline:
+                kind, fixture = pick()
+                results.append(send_fixture(config, kind, fixture, time.perf_counter(), timeout))
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    else:
+        with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+            next_at = started
+            while (next_at := next_at + rng.expovariate(rate)) < deadline:
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                kind, fixture = pick()
+                future = executor.submit(send_fixture, config, kind, fixture, next_at, timeout)
+                future.add_done_callback(lambda f: results.append(f.result()))
+    return results, time.perf_counter() - started
+
+def summarize_load(results: list, elapsed: float) -> dict:
+    latencies = [result["latency"] for result in results if "error" not in result]
+    errors = len(results) - len(latencies)
+    return {
+        "sent": len(results),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "error_rate": errors / len(results) if results else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+def saturation_reason(step: dict, previous: dict | None, open_loop: bool, max_error_rate: float, max_p95: float | None) -> str | None:
+    """ Why a load step counts as past saturation, None while the server keeps up """
+    if step["error_rate"] > max_error_rate:
+        return f"error rate {step['error_rate']:.1%}"
+    if max_p95 is not None and step["p95"] > max_p95:
+        return f"p95 {step['p95']:.2f}s over {max_p95:.2f}s"
+    if open_loop and step["throughput"] < 0.9 * step["load"]:
+        return "throughput fell behind the offered rate"
+    if not open_loop and previous is not None and step["throughput"] < 1.05 * previous["throughput"]:
+        return "more clients stopped adding throughput"
+    return None
+
+def run_loadtest(config: AppConfig, fixtures: dict, weights: dict, start: float, step_size: float, steps: int,
+                 duration: float, open_loop: bool, timeout: float, max_error_rate: float, max_p95: float | None,
+                 output: Path | None) -> None:
+    from rich.table import Table
+
+    unit = "req/s" if open_loop else "clients"
+    table = Table(title="Load test")
+    for column in ("Step", f"Load ({unit})", "Sent", "Throughput (req/s)", "p50", "p95", "p99", "Errors"):
+        table.add_column(column, justify="right")
+
+    out = open(output, "a") if output else None
+    all_results = []
+    previous = None
+    saturated = None
+    try:
+        for index in range(steps):
+            load = start + index * step_size
+            console.print(f"[bold cyan]Step {index + 1}/{steps}:[/bold cyan] {load:g} {unit} for {duration:g}s")
+            if open_loop:
+                results, elapsed = run_load_step(config, fixtures, weights, duration, timeout, rate=load)
+            else:
+                results, elapsed = run_load_step(config, fixtures, weights, duration, timeout, concurrency=int(load))
+
+            if out:
+                for result in results:
+                    out.write(json.dumps({"step": index + 1, "load": load, **result}) + "\n")
+                out.flush()
+            all_results.extend(results)
+
+            step = {"load": load, **summarize_load(results, elapsed)}
+            table.add_row(
+                str(index + 1), f"{load:g}", str(step["sent"]), f"{step['throughput']:.2f}",
+                f"{step['p50']:.2f}s", f"{step['p95']:.2f}s", f"{step['p99']:.2f}s", f"{step['error_rate']:.1%}",
+            )
+            reason = saturation_reason(step, previous, open_loop, max_error_rate, max_p95)
+            if reason:
+                saturated = (step, reason)
+                break
+            previous = step
+    except KeyboardInterrupt:
+        console.print("[bold yellow]Interrupted, reporting the steps completed so far.[/bold yellow]")
+    finally:
+        if out:
+            out.close()
+
+    console.print(table)
+
+    by_kind = Table(title="By request kind")
+    for column in ("Kind", "Sent", "p50", "p95", "p99", "Errors"):
+        by_kind.add_column(column, justify="right")
+    for kind in weights:
+        results = [result for result in all_results if result["kind"] == kind]
+        latencies = [result["latency"] for result in results if "error" not in result]
+        errors = len(results) - len(latencies)
+        by_kind.add_row(
+            kind, str(len(results)), f"{percentile(latencies, 50):.2f}s", f"{percentile(latencies, 95):.2f}s",
+            f"{percentile(latencies, 99):.2f}s", f"{errors / len(results):.1%}" if results else "-",
+        )
+    console.print(by_kind)
+
+    failures = {}
+    for result in all_results:
+        if "error" in result:
+            failures[result["error"]] = failures.get(result["error"], 0) + 1
+    for error, count in sorted(failures.items(), key=lambda item: -item[1])[:5]:
+        console.print(f"[bold red]{count} x[/bold red] {error}")
+
+    if saturated:
+        step, reason = saturated
+        healthy = f", last healthy load {previous['load']:g} {unit} at {previous['throughput']:.2f} req/s" if previous else ""
+        console.print(f"[bold yellow]Saturation point:[/bold yellow] {step['load']:g} {unit} ({reason}){healthy}")
+    elif previous:
+        console.print(f"[bold green]No saturation up to {previous['load']:g} {unit}[/bold green] ({previous['throughput']:.2f} req/s)")
+
 app = typer.Typer(
     pretty_exceptions_enable=False,  # Disable pretty exceptions to avoid conflicts with Rich
     help="A CLI for interacting with your AI and Audio API."
@@ -86,8 +698,9 @@ def main(
     if not config.token and interactive:
         console.print("[bold blue]It looks like you don't have a user token. Let's enroll you![/bold blue]")
         username = Prompt.ask("Enter a username to enroll")
+        from requests.exceptions import RequestException
         try:
-            response = requests.post(f"{config.base_url}/messages/enroll", json={"username": username})
+            response = get_session().post(f"{config.base_url}/messages/enroll", json={"username": username})
             response.raise_for_status()
             data = response.json()
             if "token" in data:
@@ -96,7 +709,7 @@ def main(
                 console.print(f"[bold green]Successfully enrolled! Your token is:[/bold green] [yellow]{config.token}[/yellow]")
             else:
                 console.print(f"[bold red]Enrollment failed:[/bold red] {data.get('error', 'Unknown error')}")
-        except requests.exceptions.RequestException as e:
+        except RequestException as e:
             console.print(f"[bold red]Error during enrollment:[/bold red] Could not connect to the API. Please check your server URL and port. ({e})")
             typer.Exit(code=1)
 
@@ -104,12 +717,28 @@ def main(
 def ask(
     ctx: typer.Context,
     prompt: Annotated[str, typer.Argument(help="The prompt to send to the AI.")] = "",
-    file: Annotated[Path, typer.Option("-f", "--file", help="Path to a text file to use as the prompt.")] = None
+    file: Annotated[Path, typer.Option("-f", "--file", help="Path to a text file to use as the prompt.")] = None,
+    batch: Annotated[Path, typer.Option("--batch", exists=True, dir_okay=False, help="JSONL file of prompts ({\"id\", \"prompt\"} per line) to run concurrently.")] = None,
+    output: Annotated[Path, typer.Option("-o", "--output", help="JSONL file for batch results, defaults to <batch>.results.jsonl. Existing results are resumed.")] = None,
+    concurrency: Annotated[int, typer.Option("-c", "--concurrency", min=1, help="Number of batch prompts in flight at once.")] = 8,
+    max_retries: Annotated[int, typer.Option("--max-retries", min=0, help="Retries per batch prompt on rate limiting, timeouts or connection errors.")] = 5,
+    timeout: Annotated[float, typer.Option("--timeout", min=1, help="Per request timeout in seconds for batch prompts, retried like a connection error.")] = 120,
 ):
     """
-    Ask the AI a question. Can take a string prompt or a text file.
+    Ask the AI a question. Can take a string prompt, a text file or a JSONL batch of prompts.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
+
+    if batch:
+        if prompt or file:
+            console.print("[bold red]Error: --batch cannot be combined with a prompt or a file.[/bold red]")
+            raise typer.Exit(code=1)
+        if not config.token:
+            console.print("[bold red]Error: No token found. Please run with -i or enroll a user first.[/bold red]")
+            raise typer.Exit(code=1)
+        run_batch(config, batch, output or batch.with_suffix(".results.jsonl"), concurrency, max_retries, timeout)
+        return
 
     if file:
         if prompt:
@@ -132,14 +761,14 @@ def ask(
 
     try:
         console.print(f"[bold cyan]Sending prompt:[/bold cyan] {prompt_text[:50]}...")
-        response = requests.post(f"{config.base_url}/messages/ask", json={"prompt": prompt_text, "token": config.token})
+        response = get_session().post(f"{config.base_url}/messages/ask", json={"prompt": prompt_text, "token": config.token})
         response.raise_for_status()
         result = response.json()
         if "message" in result:
             console.print(f"[bold green]AI Response:[/bold green] {result['message']}")
         else:
             console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
 
@@ -152,9 +781,10 @@ def enroll(
     Enroll a new user and get a token.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
     try:
         console.print(f"[bold cyan]Attempting to enroll user:[/bold cyan] {username}")
-        response = requests.post(f"{config.base_url}/messages/enroll", json={"username": username})
+        response = get_session().post(f"{config.base_url}/messages/enroll", json={"username": username})
         response.raise_for_status()
         data = response.json()
         if "token" in data:
@@ -163,7 +793,7 @@ def enroll(
             console.print(f"[bold green]Successfully enrolled! Your token is:[/bold green] [yellow]{config.token}[/yellow]")
         else:
             console.print(f"[bold red]Enrollment failed:[/bold red] {data.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
 
@@ -176,6 +806,7 @@ def remove(
     Remove a user from the database. If no token is provided, uses the current configured token.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
     token = token_to_remove if token_to_remove else config.token
 
     if not token:
@@ -188,7 +819,7 @@ def remove(
 
     try:
         console.print(f"[bold cyan]Attempting to remove token:[/bold cyan] {token}")
-        response = requests.post(f"{config.base_url}/remove", json={"token": token})
+        response = get_session().post(f"{config.base_url}/remove", json={"token": token})
         response.raise_for_status()
         result = response.json()
         if "message" in result:
@@ -199,44 +830,47 @@ def remove(
                 console.print("[bold yellow]Your configured token has been removed. Please enroll a new user.[/bold yellow]")
         else:
             console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
 
 @app.command()
 def transcribe(
     ctx: typer.Context,
-    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the audio file (mp3 or wav).")]
+    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the audio file (mp3, wav, flac or opus).")],
+    compress: Annotated[Codec, typer.Option("--compress", help="Transcode to 16 kHz mono before uploading, needs ffmpeg.")] = None,
+    run_async: Annotated[bool, typer.Option("--async", help="Run as a background job with progress, for long recordings.")] = False
 ):
     """
     Transcribe an audio file.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
     try:
         console.print(f"[bold cyan]Uploading and transcribing:[/bold cyan] {audio_file}")
-        with open(audio_file, "rb") as f:
-            files = {"file": (audio_file.name, f, "audio/mpeg" if audio_file.suffix == ".mp3" else "audio/wav")}
-            response = requests.post(f"{config.base_url}/audio/transcribe", files=files)
-        response.raise_for_status()
-        result = response.json()
-        if "transcript" in result:
-            console.print(f"[bold green]Transcript:[/bold green] {result['transcript']}")
+        if run_async:
+            run_job(config, "/jobs/transcribe", audio_file, compress)
         else:
-            console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
+            print_transcript(upload_audio(config, "/audio/transcribe", audio_file, compress=compress))
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
+    except RuntimeError as e:
+        console.print(f"[bold red]Error compressing audio:[/bold red] {e}")
+        raise typer.Exit(code=1)
 
 @app.command("audio-enroll")
 def audio_enroll(
     ctx: typer.Context,
-    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the audio file (mp3 or wav).")],
+    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the audio file (mp3, wav, flac or opus).")],
+    compress: Annotated[Codec, typer.Option("--compress", help="Transcode to 16 kHz mono before uploading, needs ffmpeg.")] = None,
     token: Annotated[str, typer.Option(help="The token of the user to enroll for voice identification. Uses configured token if not provided.")] = None
 ):
     """
     Enroll a user's voice for identification.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
     target_token = token if token else config.token
     
     if not target_token:
@@ -245,42 +879,52 @@ def audio_enroll(
 
     try:
         console.print(f"[bold cyan]Uploading and enrolling voice for token:[/bold cyan] {target_token}")
-        with open(audio_file, "rb") as f:
-            files = {"file": (audio_file.name, f, "audio/mpeg" if audio_file.suffix == ".mp3" else "audio/wav")}
-            data = {"token": target_token}
-            response = requests.post(f"{config.base_url}/audio/enroll", files=files, data=data)
-        response.raise_for_status()
-        result = response.json()
-        if "message" in result:
-            console.print(f"[bold green]Success:[/bold green] {result['message']}")
-        else:
-            console.print(f"[bold red]Error from API:[/bold red] {result.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
+        print_message(upload_audio(config, "/audio/enroll", audio_file, data={"token": target_token}, compress=compress))
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
+    except RuntimeError as e:
+        console.print(f"[bold red]Error compressing audio:[/bold red] {e}")
+        raise typer.Exit(code=1)
 
 @app.command("transcribe-identify")
 def transcribe_identify(
     ctx: typer.Context,
-    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the audio file (mp3 or wav).")]
+    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the audio file (mp3, wav, flac or opus).")],
+    compress: Annotated[Codec, typer.Option("--compress", help="Transcode to 16 kHz mono before uploading, needs ffmpeg.")] = None,
+    run_async: Annotated[bool, typer.Option("--async", help="Run as a background job with progress, for long recordings.")] = False
 ):
     """
     Transcribe an audio file and identify the speaker.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
     try:
         console.print(f"[bold cyan]Uploading, transcribing, and identifying:[/bold cyan] {audio_file}")
-        with open(audio_file, "rb") as f:
-            files = {"file": (audio_file.name, f, "audio/mpeg" if audio_file.suffix == ".mp3" else "audio/wav")}
-            response = requests.post(f"{config.base_url}/audio/transcribe_identify", files=files)
-        response.raise_for_status()
-        result = response.json()
-        if "transcript" in result and "identified_speaker" in result:
-            console.print(f"[bold green]Transcript:[/bold green] {result['transcript']}")
-            console.print(f"[bold green]Identified Speaker:[/bold green] {result['identified_speaker']}")
+        if run_async:
+            run_job(config, "/jobs/transcribe_identify", audio_file, compress)
         else:
-            console.print(f"[bold red]Error from API or unexpected response:[/bold red] {result.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
+            print_transcribe_identify(upload_audio(config, "/audio/transcribe_identify", audio_file, compress=compress))
+    except RequestException as e:
+        console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
+        raise typer.Exit(code=1)
+    except RuntimeError as e:
+        console.print(f"[bold red]Error compressing audio:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+@app.command()
+def job(
+    ctx: typer.Context,
+    job_id: Annotated[str, typer.Argument(help="The job ID returned when the job was submitted.")]
+):
+    """
+    Reattach to a background job, following its progress until it finishes.
+    """
+    config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
+    try:
+        print_job(follow_job(config, job_id))
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
 
@@ -294,18 +938,186 @@ def tts(
     Convert text to speech and save as an MP3 file.
     """
     config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
     try:
         console.print(f"[bold cyan]Converting text to speech:[/bold cyan] '{text}'")
-        response = requests.post(f"{config.base_url}/audio/tts", params={"text": text}, stream=True)
-        response.raise_for_status()
-        
-        with open(output_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        console.print(f"[bold green]TTS audio saved to:[/bold green] [yellow]{output_path.resolve()}[/yellow]")
-    except requests.exceptions.RequestException as e:
+        save_tts(config, text, output_path)
+    except RequestException as e:
+        console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+def voice_answer(config: "AppConfig", audio_file: Path, output_path: Path, token: str | None = None, compress: Codec | None = None) -> None:
+    """ Sends a spoken question to /audio/ask, printing the answer as it streams and saving the spoken answer """
+    import base64
+
+    data = {"token": token} if token else None
+    with send_audio(config, "/audio/ask", audio_file, data, compress, stream=True) as response, open(output_path, "wb") as out:
+        answering = False
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            kind = event["type"]
+
+            if kind == "speaker":
+                console.print(f"[bold green]Speaker:[/bold green] {event['user']} (conf: {event['confidence']:.2f})")
+            elif kind == "transcript":
+                console.print(f"[bold green]You said:[/bold green] {event['text'].strip()}")
+            elif kind == "text":
+                if not answering:
+                    console.print("[bold green]AI:[/bold green] ", end="")
+                    answering = True
+                console.print(event["text"], end="", markup=False, highlight=False, soft_wrap=True)
+            elif kind == "audio":
+                # Sentences arrive as separate mp3 files, which concatenate into one playable stream
+                out.write(base64.b64decode(event["data"]))
+            elif kind == "error":
+                console.print(f"\n[bold red]Error from API:[/bold red] {event['error']}")
+            elif kind == "done":
+                if answering:
+                    console.print()
+                timings = "  ".join(f"{stage} {seconds:.2f}s" for stage, seconds in event["timings"].items())
+                console.print(f"[bold cyan]Timings:[/bold cyan] {timings}")
+                console.print(f"[bold green]Spoken answer saved to:[/bold green] [yellow]{output_path.resolve()}[/yellow]")
+
+@app.command("voice-ask")
+def voice_ask(
+    ctx: typer.Context,
+    audio_file: Annotated[Path, typer.Argument(exists=True, file_okay=True, dir_okay=False, help="Path to the spoken question (mp3, wav, flac or opus).")],
+    output_path: Annotated[Path, typer.Option("-o", "--output", help="Path to save the spoken answer.")] = Path("answer.mp3"),
+    token: Annotated[str, typer.Option(help="Answer as this token instead of identifying the speaker.")] = None,
+    compress: Annotated[Codec, typer.Option("--compress", help="Transcode to 16 kHz mono before uploading, needs ffmpeg.")] = None
+):
+    """
+    Ask the AI with your voice: speaker identification, transcription, answer and speech in one request.
+    """
+    config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
+    try:
+        voice_answer(config, audio_file, output_path, token, compress)
+    except RequestException as e:
         console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
         raise typer.Exit(code=1)
+    except RuntimeError as e:
+        console.print(f"[bold red]Error compressing audio:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+@app.command()
+def loadtest(
+    ctx: typer.Context,
+    fixtures: Annotated[Path, typer.Option("--fixtures", exists=True, dir_okay=False, help="JSONL of recorded requests to replay, see fixtures/loadtest.jsonl.")] = LOADTEST_FIXTURES,
+    mix: Annotated[str, typer.Option("--mix", help="Relative weights of the request kinds, e.g. ask=8,tts=1,transcribe=1.")] = "ask=8,tts=1,transcribe=1",
+    rate: Annotated[float, typer.Option("--rate", min=0.01, help="Open loop: requests per second (Poisson arrivals).")] = None,
+    concurrency: Annotated[int, typer.Option("-c", "--concurrency", min=1, help="Closed loop: clients sending back to back. Used when --rate is not given.")] = 4,
+    steps: Annotated[int, typer.Option("--steps", min=1, help="Load steps to ramp through, stopping at the first saturated one.")] = 1,
+    step_size: Annotated[float, typer.Option("--step", min=0, help="Load added per step, defaults to the starting load.")] = None,
+    duration: Annotated[float, typer.Option("-d", "--duration", min=1, help="Seconds per step.")] = 30,
+    timeout: Annotated[float, typer.Option("--timeout", min=1, help="Per request timeout in seconds, counted as an error.")] = 120,
+    max_error_rate: Annotated[float, typer.Option("--max-error-rate", min=0, max=1, help="A step with more errors than this is saturated.")] = 0.01,
+    max_p95: Annotated[float, typer.Option("--max-p95", min=0, help="A step with a slower p95 latency (seconds) is saturated.")] = None,
+    output: Annotated[Path, typer.Option("-o", "--output", help="JSONL file to append every request's result to.")] = None
+):
+    """
+    Generate mixed ask, transcribe and tts load and report throughput, latency percentiles, errors and the saturation point.
+    Run the server against server/stubs.py to test without provider quota.
+    """
+    config: AppConfig = ctx.obj["config"]
+
+    try:
+        weights = parse_mix(mix)
+        loaded = load_fixtures(fixtures)
+    except (ValueError, OSError) as e:
+        console.print(f"[bold red]Error: {e}[/bold red]")
+        raise typer.Exit(code=1)
+
+    missing = [kind for kind in weights if not loaded[kind]]
+    if not weights or missing:
+        console.print(f"[bold red]Error: No fixtures for {', '.join(missing) or 'the mix'} in {fixtures}.[/bold red]")
+        raise typer.Exit(code=1)
+    if "ask" in weights and not config.token and not all(fixture.get("token") for fixture in loaded["ask"]):
+        console.print("[bold red]Error: No token found. Please run with -i or enroll a user first.[/bold red]")
+        raise typer.Exit(code=1)
+
+    open_loop = rate is not None
+    start = rate if open_loop else concurrency
+    get_session(pool_size=256 if open_loop else int(start + (steps - 1) * (step_size or start)))
+    run_loadtest(config, loaded, weights, start, step_size or start, steps, duration, open_loop, timeout, max_error_rate, max_p95, output)
+
+CHAT_HELP = """[bold]Commands:[/bold]
+  /transcribe <file>   Transcribe an audio file
+  /identify <file>     Transcribe an audio file and identify the speakers
+  /enroll <file>       Enroll your voice for identification
+  /voice <file>        Ask with a spoken question, the answer is saved to answer.mp3
+  /tts <text>          Convert text to speech (saved to output.mp3)
+  /help                Show this message
+  /exit                Leave the chat"""
+
+def run_slash_command(config: AppConfig, line: str) -> bool:
+    """ Runs a REPL slash-command, returns False when the session should end """
+    command, _, arg = line[1:].partition(" ")
+    arg = arg.strip()
+
+    if command in ("exit", "quit"):
+        return False
+    if command == "help":
+        console.print(CHAT_HELP)
+        return True
+    if not arg:
+        console.print(f"[bold red]Error: /{command} needs an argument. Type /help for usage.[/bold red]")
+        return True
+
+    if command == "tts":
+        save_tts(config, arg, Path("output.mp3"))
+        return True
+
+    audio_file = Path(arg).expanduser()
+    if command not in ("transcribe", "identify", "enroll", "voice"):
+        console.print(f"[bold red]Unknown command:[/bold red] /{command}. Type /help for usage.")
+    elif not audio_file.is_file():
+        console.print(f"[bold red]Error: File not found at '{audio_file}'[/bold red]")
+    elif command == "transcribe":
+        print_transcript(upload_audio(config, "/audio/transcribe", audio_file))
+    elif command == "identify":
+        print_transcribe_identify(upload_audio(config, "/audio/transcribe_identify", audio_file))
+    elif command == "enroll":
+        print_message(upload_audio(config, "/audio/enroll", audio_file, data={"token": config.token}))
+    elif command == "voice":
+        voice_answer(config, audio_file, Path("answer.mp3"))
+    return True
+
+@app.command()
+def chat(ctx: typer.Context):
+    """
+    Start an interactive chat session. Answers are streamed and one connection is kept alive between questions.
+    """
+    config: AppConfig = ctx.obj["config"]
+    from requests.exceptions import RequestException
+
+    if not config.token:
+        console.print("[bold red]Error: No token found. Please run with -i or enroll a user first.[/bold red]")
+        raise typer.Exit(code=1)
+
+    console.print("[bold blue]Chat session started. Type /help for commands, /exit to leave.[/bold blue]")
+    while True:
+        try:
+            line = console.input("[bold cyan]You:[/bold cyan] ").strip()
+        except (EOFError, KeyboardInterrupt):
+            console.print()
+            break
+        if not line:
+            continue
+
+        try:
+            if line.startswith("/"):
+                if not run_slash_command(config, line):
+                    break
+            else:
+                stream_answer(config, line)
+        except KeyboardInterrupt:
+            # Abandon the current answer but keep the session
+            console.print("\n[bold yellow]Interrupted.[/bold yellow]")
+        except RequestException as e:
+            console.print(f"[bold red]Error connecting to API:[/bold red] {e}")
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -1,7 +1,6 @@
 import os
 import numpy as np
 from resemblyzer import VoiceEncoder, preprocess_wav
-from pydub import AudioSegment
 from pyannote.audio import Pipeline
 import torchaudio
 import whisper
@@ -9,9 +8,10 @@ from pyannote.core import Segment
 from scipy.spatial.distance import cosine
 import warnings
 
-import hashlib
-from gtts import gTTS
-from os.path import exists
+import longform
+from models import ModelSlot, start_reaper
+# Re-exported so callers can keep using audio.* for the model free helpers too
+from audio_io import wav_path_for, to_wav, load_samples, load_pcm16, tts, tts_bytes
 
 from dotenv import load_dotenv
 from os.path import dirname, join
@@ -20,7 +20,7 @@ from os import getenv
 load_dotenv(join(dirname(__file__), ".env"))
 
 # TODO:
-# 1. Add more accepted audio types (wav, mp3, aac, flacc)
+# 1. Add more accepted audio types (aac)
 
 # Enrollment help:
 # Speaking types
@@ -41,49 +41,149 @@ warnings.filterwarnings("ignore", category=UserWarning, module="webrtcvad")
 # Variables
 SPEAKER_DB_PATH = "speaker_db.npy"
 
-# Global models
-encoder = VoiceEncoder()
-whisper_model = whisper.load_model("small")  # Can be "small", "medium", etc.
-diarization_pipeline = Pipeline.from_pretrained(
+# Adaptive speaker identification: clips with little speech, or whose partial embeddings all
+# agree with the whole-utterance embedding, are matched directly instead of running diarization
+FAST_PATH_MAX_SPEECH_SECONDS = float(getenv("FAST_PATH_MAX_SPEECH_SECONDS", "8"))
+FAST_PATH_MAX_SECONDS = float(getenv("FAST_PATH_MAX_SECONDS", "120"))
+FAST_PATH_MIN_SIMILARITY = float(getenv("FAST_PATH_MIN_SIMILARITY", "0.75"))
+
+# Global models, each run on its own thread (see models.ModelSlot for residency and thread settings)
+encoder_slot = ModelSlot("encoder", VoiceEncoder)
+whisper_slot = ModelSlot("whisper", lambda: whisper.load_model(getenv("WHISPER_MODEL", "small")))  # Can be "small", "medium", etc.
+diarization_slot = ModelSlot("diarization", lambda: Pipeline.from_pretrained(
     "pyannote/speaker-diarization-3.1",
     use_auth_token=getenv("HUGGING_FACE_TOKEN")  # ← insert token here
-)
+))
+# The long-form worker pool follows the same preload and idle unloading
+SLOTS = [encoder_slot, whisper_slot, diarization_slot, longform.pool]
+
+def preload_models():
+    """ Loads the resident models up front and starts unloading idle ones """
+    for slot in SLOTS:
+        slot.preload()
+    start_reaper(SLOTS)
+
+def embed(wav: np.ndarray) -> np.ndarray:
+    return encoder_slot.run(lambda encoder: encoder.embed_utterance(wav))
+
+def whisper_transcribe(audio) -> dict:
+    """ Transcribes a wav path or 16 kHz float32 samples """
+    return whisper_slot.run(lambda model: model.transcribe(audio, language="en", verbose=False))
+
+def transcribe_wav(wav_path: str, report, low: float, high: float, long_audio: bool | None = None) -> dict:
+    """
+    Whole-file whisper for short audio, VAD windows across the longform process pool for long recordings.
+    long_audio=None decides by duration (LONGFORM_MIN_SECONDS). Progress is reported between low and high.
+    """
+    if long_audio is None:
+        long_audio = longform.is_long(wav_path)
+    if not long_audio:
+        return whisper_transcribe(wav_path)
+    return longform.transcribe_long(wav_path, progress=lambda fraction: report("transcribe", low + (high - low) * fraction))
 
-# Load or initialize speaker DB
+# Load or initialize speaker DB. Only touched on the encoder's thread, so enrollments
+# and matches from concurrent requests never see it mid-update
 if os.path.exists(SPEAKER_DB_PATH):
     speaker_db = np.load(SPEAKER_DB_PATH, allow_pickle=True).item()
 else:
     speaker_db = {}
 
-def mp3_to_wav(mp3_path: str, wav_path: str):
-    audio = AudioSegment.from_mp3(mp3_path)
-    audio = audio.set_frame_rate(16000).set_channels(1)
-    audio.export(wav_path, format="wav")
-
-def enroll_speaker(token: str, mp3_path: str):
+def enroll_speaker(token: str, audio_path: str):
     token = token.lower()
-    wav_path = mp3_path.replace(".mp3", ".wav")
-    mp3_to_wav(mp3_path, wav_path)
+    wav_path = wav_path_for(audio_path)
+    to_wav(audio_path, wav_path)
     wav = preprocess_wav(wav_path)
-    embedding = encoder.embed_utterance(wav)
+    embedding = embed(wav)
+    encoder_slot.run(lambda encoder: _add_embedding(token, embedding))
+
+def _add_embedding(token: str, embedding: np.ndarray) -> None:
     if token in speaker_db:
         speaker_db[token].append(embedding)
         print(f"[+] Added another embedding for speaker '{token}'.")
     else:
         speaker_db[token] = [embedding]
         print(f"[✔] Enrolled new speaker '{token}'.")
-    
+
     np.save(SPEAKER_DB_PATH, speaker_db)
 
-def classify_and_transcribe(mp3_path: str):
-    wav_path = mp3_path.replace(".mp3", ".wav")
-    mp3_to_wav(mp3_path, wav_path)
+def _no_progress(stage: str, fraction: float):
+    pass
+
+def match_speaker(emb: np.ndarray) -> tuple[str | None, float]:
+    """ Best matching enrolled token for an embedding and its cosine similarity """
+    return encoder_slot.run(lambda encoder: _best_match(emb))
+
+def _best_match(emb: np.ndarray) -> tuple[str | None, float]:
+    if not speaker_db:
+        return None, 0.0
+    scores = {
+        token: max(1 - cosine(emb, ref_emb) for ref_emb in emb_list)
+        for token, emb_list in speaker_db.items()
+    }
+    best_speaker = max(scores, key=scores.get)
+    return best_speaker, float(scores[best_speaker])
+
+def single_speaker_check(wav_path: str) -> tuple[bool, np.ndarray | None, tuple[float, float] | None]:
+    """
+    Decides whether a clip can skip diarization: true when it has little speech or looks like one speaker.
+    Returns (single, whole-utterance embedding, (first, last) speech time), the embedding and span
+    are None when the check didn't get that far.
+    """
+    # Long recordings are conversations far more often than not, don't spend the check on them
+    if longform.wav_duration(wav_path) > FAST_PATH_MAX_SECONDS:
+        return False, None, None
+
+    pcm = load_pcm16(wav_path)
+    frame_seconds = longform.FRAME / 16000
+    spoken = np.flatnonzero(longform.speech_frames(pcm))
+    if len(spoken) == 0:
+        return True, np.zeros(0), None
+    span = (spoken[0] * frame_seconds, (spoken[-1] + 1) * frame_seconds)
+    speech_seconds = len(spoken) * frame_seconds
+
+    wav = preprocess_wav(pcm.astype(np.float32) / 32768.0, source_sr=16000)
+    if len(wav) == 0:
+        return True, np.zeros(0), None
+    emb, partials, _ = encoder_slot.run(lambda encoder: encoder.embed_utterance(wav, return_partials=True))
+    if speech_seconds <= FAST_PATH_MAX_SPEECH_SECONDS:
+        return True, emb, span
+
+    # Partial embeddings are unit length, so the dot product is the cosine similarity.
+    # A second voice shows up as partials drifting away from the whole-clip average.
+    similarity = partials @ (emb / np.linalg.norm(emb))
+    return bool(np.percentile(similarity, 10) >= FAST_PATH_MIN_SIMILARITY), emb, span
+
+def classify_and_transcribe(audio_path: str, progress=None, long_audio: bool | None = None, diarize: bool | None = None):
+    """
+    progress, if given, is called with (stage, overall fraction done) as the work advances.
+    diarize=None skips diarization for short or single speaker clips, True always runs it, False never does.
+    The result's "path" is "single_speaker" or "diarization".
+    """
+    report = progress or _no_progress
+
+    report("decode", 0.0)
+    wav_path = wav_path_for(audio_path)
+    to_wav(audio_path, wav_path)
+
+    if diarize is not True:
+        report("analyze", 0.02)
+        single, emb, span = single_speaker_check(wav_path)
+        if single or diarize is False:
+            return identify_single_speaker(wav_path, emb, span, report, long_audio)
+
+    def diarization_hook(step_name, step_artifact, file=None, total=None, completed=None):
+        # pyannote reports batches done for segmentation, then for embeddings
+        if total:
+            offset = 0.5 if step_name == "embeddings" else 0.0
+            report("diarize", 0.05 + 0.35 * (offset + 0.5 * completed / total))
 
     print("[🔎] Running diarization...")
-    diarization = diarization_pipeline(wav_path)
+    report("diarize", 0.05)
+    diarization = diarization_slot.run(lambda pipeline: pipeline(wav_path, hook=diarization_hook))
 
     print("[🧠] Transcribing full audio...")
-    result = whisper_model.transcribe(wav_path, language="en", verbose=False)
+    report("transcribe", 0.4)
+    result = transcribe_wav(wav_path, report, 0.4, 0.8, long_audio)
     full_transcript = result["text"]
 
     def get_segment_audio(file_path, segment: Segment):
@@ -94,16 +194,13 @@ def classify_and_transcribe(mp3_path: str):
 
     speaker_segments = []
 
-    for turn, _, _ in diarization.itertracks(yield_label=True):
+    report("identify", 0.8)
+    turns = list(diarization.itertracks(yield_label=True))
+    for index, (turn, _, _) in enumerate(turns):
+        report("identify", 0.8 + 0.2 * index / len(turns))
         audio, sr = get_segment_audio(wav_path, turn)
-        emb = encoder.embed_utterance(audio.numpy()[0])
-        scores = {
-            token: max(1 - cosine(emb, ref_emb) for ref_emb in emb_list)
-            for token, emb_list in speaker_db.items()
-        }
-
-        best_speaker = max(scores, key=scores.get)
-        confidence = scores[best_speaker]
+        emb = embed(audio.numpy()[0])
+        best_speaker, confidence = match_speaker(emb)
 
         print(f"[🗣️] {best_speaker} [{turn.start:.1f}s → {turn.end:.1f}s] (conf: {confidence:.2f})")
         speaker_segments.append({
@@ -113,30 +210,68 @@ def classify_and_transcribe(mp3_path: str):
             "confidence": float(confidence)
         })
 
+    report("done", 1.0)
     return {
         "transcript": full_transcript,
-        "speaker_segments": speaker_segments
+        "speaker_segments": speaker_segments,
+        "path": "diarization"
     }
 
-def transcribe(mp3_path: str):
-    wav_path = mp3_path.replace(".mp3", ".wav")
-    mp3_to_wav(mp3_path, wav_path)
+def identify_single_speaker(wav_path: str, emb: np.ndarray | None, span: tuple[float, float] | None, report, long_audio: bool | None) -> dict:
+    """ The no-diarization path: one embedding for the whole clip, one speaker segment over its speech """
+    if emb is None:
+        # Diarization explicitly disabled for a recording too long for the single speaker check
+        wav = preprocess_wav(wav_path)
+        emb = embed(wav) if len(wav) else np.zeros(0)
+        span = span or (0.0, longform.wav_duration(wav_path))
+
+    speaker_segments = []
+    if len(emb) and span:
+        best_speaker, confidence = match_speaker(emb)
+        if best_speaker is not None:
+            print(f"[🗣️] {best_speaker} [{span[0]:.1f}s → {span[1]:.1f}s] (conf: {confidence:.2f}, single speaker)")
+            speaker_segments.append({
+                "speaker": best_speaker,
+                "start": float(span[0]),
+                "end": float(span[1]),
+                "confidence": confidence
+            })
+
+    print("[🧠] Transcribing full audio...")
+    report("transcribe", 0.2)
+    result = transcribe_wav(wav_path, report, 0.2, 1.0, long_audio)
+
+    report("done", 1.0)
+    return {
+        "transcript": result["text"],
+        "speaker_segments": speaker_segments,
+        "path": "single_speaker"
+    }
+
+def transcribe(audio_path: str, progress=None, long_audio: bool | None = None):
+    report = progress or _no_progress
+
+    report("decode", 0.0)
+    wav_path = wav_path_for(audio_path)
+    to_wav(audio_path, wav_path)
     
-    result = whisper_model.transcribe(wav_path, language="en", verbose=False)
+    report("transcribe", 0.1)
+    result = transcribe_wav(wav_path, report, 0.1, 1.0, long_audio)
     full_transcript = result["text"]
+    report("done", 1.0)
     
     return full_transcript
 
-def tts(text: str):
-    tts = gTTS(text=text, lang="en")
-    h = hashlib.sha256(text.encode()).hexdigest()
-    print(f"hashed tts file: /tmp/{h}.mp3")
-    filepath = f"/tmp/{h}.mp3"
-    
-    if exists(filepath):
-        print(f"tts file already exists: {filepath}")
-        return filepath
-    
-    tts.save(filepath)
-    
-    return filepath
+def identify_speaker(samples: np.ndarray) -> tuple[str | None, float]:
+    """ Matches one whole-utterance embedding against the speaker db, returns the best token and its score """
+    if not speaker_db:
+        return None, 0.0
+
+    wav = preprocess_wav(samples, source_sr=16000)
+    if len(wav) == 0:
+        return None, 0.0
+    return match_speaker(embed(wav))
+
+def transcribe_samples(samples: np.ndarray) -> str:
+    result = whisper_transcribe(samples)
+    return result["text"]
@@ -0,0 +1,78 @@
+import os
+import io
+import hashlib
+import subprocess
+import httpx
+import numpy as np
+from gtts import gTTS
+from os.path import exists
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Audio helpers that need no models (ffmpeg decoding and Google TTS).
+# Kept apart from audio.py so API workers can use them without importing torch.
+
+SAMPLE_RATE = 16000
+FFMPEG = "ffmpeg"
+# Speech from an HTTP service ({"text", "lang"} in, mp3 out) instead of Google TTS, e.g. the stubs.py server
+TTS_URL = getenv("TTS_URL")
+
+def wav_path_for(audio_path: str) -> str:
+    # Distinct suffix so a wav upload is never decoded onto itself
+    return os.path.splitext(audio_path)[0] + ".16k.wav"
+
+def to_wav(audio_path: str, wav_path: str):
+    """
+    Decodes any ffmpeg supported file (mp3, wav, flac, opus...) to 16 kHz mono wav.
+    ffmpeg streams file to file, so memory use doesn't grow with the recording length.
+    """
+    subprocess.run(
+        [FFMPEG, "-nostdin", "-loglevel", "error", "-y",
+         "-i", audio_path, "-ac", "1", "-ar", str(SAMPLE_RATE), wav_path],
+        check=True,
+    )
+
+def load_pcm16(audio_path: str) -> np.ndarray:
+    """ Decodes any ffmpeg supported file to 16 kHz mono int16 samples, half the memory of float32 """
+    result = subprocess.run(
+        [FFMPEG, "-nostdin", "-loglevel", "error", "-i", audio_path,
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+        capture_output=True,
+        check=True,
+    )
+    return np.frombuffer(result.stdout, np.int16)
+
+def load_samples(audio_path: str) -> np.ndarray:
+    """ Decodes any ffmpeg supported file straight to 16 kHz mono float32 samples, no intermediate wav """
+    return load_pcm16(audio_path).astype(np.float32) / 32768.0
+
+def tts(text: str):
+    h = hashlib.sha256(text.encode()).hexdigest()
+    print(f"hashed tts file: /tmp/{h}.mp3")
+    filepath = f"/tmp/{h}.mp3"
+
+    if exists(filepath):
+        print(f"tts file already exists: {filepath}")
+        return filepath
+
+    audio = tts_bytes(text)
+    with open(filepath, "wb") as f:
+        f.write(audio)
+
+    return filepath
+
+def tts_bytes(text: str) -> bytes:
+    """ Like tts but returns the mp3 in memory, used for streaming sentence by sentence """
+    if TTS_URL:
+        response = httpx.post(TTS_URL, json={"text": text, "lang": "en"}, timeout=60)
+        response.raise_for_status()
+        return response.content
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang="en").write_to_fp(buffer)
+    return buffer.getvalue()
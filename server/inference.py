@@ -0,0 +1,249 @@
+import gc
+import os
+import queue
+import secrets
+import stat
+import threading
+import numpy as np
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Listener, Client, Connection
+from multiprocessing.shared_memory import SharedMemory
+
+import audio_io
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Shared inference service.
+#
+# Run `python inference.py` once per node and set INFERENCE_SOCKET for the API workers:
+# the whisper, pyannote and Resemblyzer models are then loaded once, in the service, and
+# any number of uvicorn workers send it calls over a unix socket. Sample buffers go through
+# shared memory, only a small descriptor is pickled.
+#
+# Without INFERENCE_SOCKET the models run inside the API process as before.
+#
+# The listener unpickles what connected clients send, so the authkey is all that keeps other
+# local users from running code in the service. Set INFERENCE_AUTHKEY, or leave it unset and
+# the service writes a random key to <socket>.key (mode 0600) for the API workers to read.
+
+INFERENCE_SOCKET = getenv("INFERENCE_SOCKET")
+DEFAULT_SOCKET = "/tmp/nate-inference.sock"
+# Default of earlier versions, public and therefore refused
+PUBLIC_AUTHKEY = "nate"
+
+# Model backed functions of the audio module the service exposes. Decoding and TTS need no
+# models and stay in the API workers.
+REMOTE_FUNCTIONS = ("transcribe", "enroll_speaker", "classify_and_transcribe", "identify_speaker", "transcribe_samples")
+
+class InferenceError(RuntimeError):
+    """ Raised when the inference service is unreachable or a call fails inside it """
+
+def key_path(address: str) -> str:
+    return address + ".key"
+
+def load_authkey(address: str, create: bool = False) -> bytes:
+    """ INFERENCE_AUTHKEY, else the key file next to the socket, generated first when create is set """
+    key = getenv("INFERENCE_AUTHKEY")
+    if key:
+        if key == PUBLIC_AUTHKEY:
+            raise InferenceError(f"INFERENCE_AUTHKEY is the public default '{PUBLIC_AUTHKEY}', set a secret or unset it to use a generated key")
+        return key.encode()
+
+    path = key_path(address)
+    if create and not os.path.exists(path):
+        # O_EXCL: never write into a file someone else created first
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        print(f"[🔑] Generated inference authkey in {path}")
+
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        raise InferenceError(f"No INFERENCE_AUTHKEY and no key file at {path}, start the inference service first") from None
+    # A key other users can read or plant is no secret
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise InferenceError(f"{path} must be owned by this user with mode 0600")
+    with open(path, "r") as f:
+        return f.read().strip().encode()
+
+class SharedArray:
+    """ Describes a numpy array placed in shared memory, sent in place of the array itself """
+
+    def __init__(self, name: str, shape: tuple, dtype: str) -> None:
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+def share(array: np.ndarray) -> tuple[SharedMemory, SharedArray]:
+    shm = SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, SharedArray(shm.name, array.shape, array.dtype.str)
+
+class RemoteAudio:
+    """ Same interface as the audio module, with the model calls sent to the inference service """
+
+    wav_path_for = staticmethod(audio_io.wav_path_for)
+    load_samples = staticmethod(audio_io.load_samples)
+    tts = staticmethod(audio_io.tts)
+    tts_bytes = staticmethod(audio_io.tts_bytes)
+
+    def __init__(self, address: str, authkey: bytes | None = None) -> None:
+        self.address = address
+        # Read on first connect, the service may create the key file after the API starts
+        self.authkey = authkey
+        # Idle connections, a connection is used by one caller at a time
+        self._idle = queue.SimpleQueue()
+
+    def _connection(self) -> Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            if self.authkey is None:
+                self.authkey = load_authkey(self.address)
+            return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+
+    def _call(self, name: str, *args, progress=None, **options):
+        """ Arrays in args go through shared memory, options are sent as keyword arguments """
+        shared = []
+        wire_args = []
+        for arg in args:
+            if isinstance(arg, np.ndarray):
+                shm, descriptor = share(arg)
+                shared.append(shm)
+                wire_args.append(descriptor)
+            else:
+                wire_args.append(arg)
+
+        try:
+            conn = self._connection()
+            try:
+                conn.send((name, wire_args, options, progress is not None))
+                # Progress updates, if asked for, arrive before the result
+                while (message := conn.recv())[0] == "progress":
+                    progress(message[1], message[2])
+                status, value = message
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.put(conn)
+        except AuthenticationError as e:
+            # Re-read the key next time, the service may have generated a new one
+            self.authkey = None
+            raise InferenceError(f"Inference service rejected the authkey: {e}") from e
+        except (EOFError, OSError) as e:
+            raise InferenceError(f"Inference service unavailable: {e}") from e
+        finally:
+            # The service only borrows the buffers, the caller owns them
+            for shm in shared:
+                shm.close()
+                shm.unlink()
+
+        if status == "error":
+            raise InferenceError(value)
+        return value
+
+    def transcribe(self, audio_path: str, progress=None, long_audio: bool | None = None) -> str:
+        return self._call("transcribe", audio_path, progress=progress, long_audio=long_audio)
+
+    def enroll_speaker(self, token: str, audio_path: str):
+        return self._call("enroll_speaker", token, audio_path)
+
+    def classify_and_transcribe(self, audio_path: str, progress=None, long_audio: bool | None = None, diarize: bool | None = None) -> dict:
+        return self._call("classify_and_transcribe", audio_path, progress=progress, long_audio=long_audio, diarize=diarize)
+
+    def identify_speaker(self, samples: np.ndarray) -> tuple[str | None, float]:
+        return self._call("identify_speaker", samples)
+
+    def transcribe_samples(self, samples: np.ndarray) -> str:
+        return self._call("transcribe_samples", samples)
+
+    def preload_models(self):
+        # Models live in the inference service
+        pass
+
+def load_engine():
+    """ The audio module itself, or a client for the inference service when INFERENCE_SOCKET is set """
+    if INFERENCE_SOCKET:
+        return RemoteAudio(INFERENCE_SOCKET)
+    import audio
+    return audio
+
+engine = load_engine()
+
+def _handle(conn: Connection, audio) -> None:
+    """ Serves calls from one API worker connection until it closes """
+    try:
+        while True:
+            try:
+                name, args, options, wants_progress = conn.recv()
+            except EOFError:
+                break
+
+            attached = []
+            call_args = []
+            try:
+                if name not in REMOTE_FUNCTIONS:
+                    raise ValueError(f"Unknown function {name}")
+                for arg in args:
+                    if isinstance(arg, SharedArray):
+                        shm = SharedMemory(name=arg.name)
+                        # The client unlinks the segment, don't let this process' tracker do it too
+                        resource_tracker.unregister(shm._name, "shared_memory")
+                        attached.append(shm)
+                        call_args.append(np.ndarray(arg.shape, np.dtype(arg.dtype), buffer=shm.buf))
+                    else:
+                        call_args.append(arg)
+                kwargs = dict(options)
+                if wants_progress:
+                    kwargs["progress"] = lambda stage, fraction: conn.send(("progress", stage, fraction))
+                reply = ("ok", getattr(audio, name)(*call_args, **kwargs))
+            except Exception as e:
+                print(f"[!] {name} failed: {e}")
+                reply = ("error", f"{type(e).__name__}: {e}")
+            finally:
+                call_args.clear()
+                for shm in attached:
+                    try:
+                        shm.close()
+                    except BufferError:
+                        # A view outlived the call (reference cycle), collect it and retry
+                        gc.collect()
+                        shm.close()
+
+            conn.send(reply)
+    finally:
+        conn.close()
+
+def serve(address: str | None = None) -> None:
+    address = address or INFERENCE_SOCKET or DEFAULT_SOCKET
+    # Before loading any model, so a bad key fails fast
+    authkey = load_authkey(address, create=True)
+
+    import audio
+    import longform
+    longform.in_service = True
+    audio.preload_models()
+
+    if os.path.exists(address):
+        os.remove(address)
+
+    with Listener(address, family="AF_UNIX", authkey=authkey) as listener:
+        os.chmod(address, 0o600)
+        print(f"[✔] Inference service listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, AuthenticationError) as e:
+                # Includes failed authentication, keep serving everyone else
+                print(f"[!] Rejected connection: {e}")
+                continue
+            threading.Thread(target=_handle, args=(conn, audio), daemon=True).start()
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from inference import engine
+from uploads import delete_file
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Background jobs for long audio.
+# Jobs and their uploads are kept on disk (sqlite + JOBS_DIR), so queued and interrupted
+# jobs are picked up again after a restart. Every API worker runs JOB_WORKERS job loops,
+# claiming jobs atomically from the shared database.
+
+JOBS_DB = getenv("JOBS_DB", "jobs.db")
+JOBS_DIR = getenv("JOBS_DIR", "jobs")
+JOB_WORKERS = int(getenv("JOB_WORKERS", "1"))
+JOB_RETENTION_SECONDS = float(getenv("JOB_RETENTION_HOURS", "24")) * 3600
+# A running job whose heartbeat is older than this is assumed lost (crash, restart) and requeued
+JOB_STALE_SECONDS = float(getenv("JOB_STALE_SECONDS", "120"))
+# A job lost this many times is failed instead of requeued, it is likely what crashes the worker
+JOB_MAX_ATTEMPTS = int(getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(getenv("JOB_POLL_SECONDS", "1"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+KINDS = {
+    "transcribe": lambda path, progress: {"transcript": engine.transcribe(path, progress=progress)},
+    "transcribe_identify": lambda path, progress: engine.classify_and_transcribe(path, progress=progress),
+}
+
+class JobStore:
+    def __init__(self, path: str = JOBS_DB) -> None:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        self.lock = threading.Lock()
+        # Autocommit, transactions are explicit where a read and write must be atomic
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                file_path TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                finished REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Databases from before attempts were counted
+        if "attempts" not in {column["name"] for column in self.db.execute("PRAGMA table_info(jobs)")}:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _execute(self, query: str, params: tuple = ()):
+        with self.lock:
+            return self.db.execute(query, params).fetchall()
+
+    def create(self, kind: str, upload_path: str) -> str:
+        """ Queues a job, taking ownership of the uploaded file """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown job kind {kind}")
+        job_id = str(uuid.uuid4())
+        # Named by job ID so the job and its results can be found from the file
+        file_path = join(JOBS_DIR, job_id + os.path.splitext(upload_path)[1])
+        os.replace(upload_path, file_path)
+
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, status, stage, file_path, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, QUEUED, file_path, now, now),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """ The public view of a job, without internal fields """
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": round(row["progress"], 4),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created": row["created"],
+            "finished": row["finished"],
+        }
+
+    def claim(self) -> sqlite3.Row | None:
+        """ Atomically takes the oldest queued job, safe across API worker processes """
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self.db.execute(
+                        "UPDATE jobs SET status = ?, stage = ?, updated = ?, attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, "starting", time.time(), row["id"]),
+                    )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return row
+
+    def progress(self, job_id: str, stage: str, fraction: float) -> None:
+        self._execute(
+            "UPDATE jobs SET stage = ?, progress = ?, updated = ? WHERE id = ? AND status = ?",
+            (stage, fraction, time.time(), job_id, RUNNING),
+        )
+
+    def heartbeat(self, job_id: str) -> None:
+        self._execute("UPDATE jobs SET updated = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING))
+
+    def finish(self, job_id: str, result: dict) -> None:
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, stage = ?, progress = 1, result = ?, updated = ?, finished = ? WHERE id = ?",
+            (DONE, DONE, json.dumps(result), now, now, job_id),
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, stage = ?, error = ?, updated = ?, finished = ? WHERE id = ?",
+            (FAILED, FAILED, error, now, now, job_id),
+        )
+
+    def requeue_stale(self) -> tuple[int, int]:
+        """ Requeues lost jobs, or fails them once they used up JOB_MAX_ATTEMPTS. Returns (requeued, failed) """
+        now = time.time()
+        stale = now - JOB_STALE_SECONDS
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                failed = self.db.execute(
+                    "UPDATE jobs SET status = ?, stage = ?, error = ?, updated = ?, finished = ? "
+                    "WHERE status = ? AND updated < ? AND attempts >= ? RETURNING id",
+                    (FAILED, FAILED, f"Gave up after {JOB_MAX_ATTEMPTS} attempts", now, now, RUNNING, stale, JOB_MAX_ATTEMPTS),
+                ).fetchall()
+                requeued = self.db.execute(
+                    "UPDATE jobs SET status = ?, stage = ?, progress = 0 WHERE status = ? AND updated < ? RETURNING id",
+                    (QUEUED, QUEUED, RUNNING, stale),
+                ).fetchall()
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return len(requeued), len(failed)
+
+    def purge_expired(self) -> int:
+        """ Deletes finished jobs past the retention period """
+        rows = self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished < ? RETURNING file_path",
+            (*FINISHED, time.time() - JOB_RETENTION_SECONDS),
+        )
+        for row in rows:
+            delete_upload(row["file_path"])
+        return len(rows)
+
+def delete_upload(file_path: str) -> None:
+    delete_file(file_path)
+    delete_file(engine.wav_path_for(file_path))
+
+async def run_job(store: JobStore, job: sqlite3.Row) -> None:
+    job_id = job["id"]
+    last = {"stage": None, "fraction": -1.0}
+
+    def progress(stage: str, fraction: float) -> None:
+        # Skip writes for changes nobody would notice
+        if stage == last["stage"] and fraction - last["fraction"] < 0.01:
+            return
+        last.update(stage=stage, fraction=fraction)
+        store.progress(job_id, stage, fraction)
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(JOB_STALE_SECONDS / 4)
+            await run_in_threadpool(store.heartbeat, job_id)
+
+    print(f"[⚙] Running {job['kind']} job {job_id}")
+    beat = asyncio.ensure_future(heartbeat())
+    try:
+        result = await run_in_threadpool(KINDS[job["kind"]], job["file_path"], progress)
+        await run_in_threadpool(store.finish, job_id, result)
+    except Exception as e:
+        print(f"[!] Job {job_id} failed: {e}")
+        await run_in_threadpool(store.fail, job_id, str(e))
+    finally:
+        beat.cancel()
+    # The result is stored, the audio is no longer needed
+    delete_upload(job["file_path"])
+
+async def worker(store: JobStore) -> None:
+    while True:
+        job = await run_in_threadpool(store.claim)
+        if job is None:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+        await run_job(store, job)
+
+async def janitor(store: JobStore) -> None:
+    """ Requeues jobs lost to a crash or restart and purges expired results """
+    while True:
+        requeued, failed = await run_in_threadpool(store.requeue_stale)
+        if requeued:
+            print(f"[↺] Requeued {requeued} interrupted job(s)")
+        if failed:
+            print(f"[!] Failed {failed} job(s) interrupted {JOB_MAX_ATTEMPTS} times")
+        await run_in_threadpool(store.purge_expired)
+        await asyncio.sleep(JOB_STALE_SECONDS / 2)
+
+def start(store: JobStore) -> list:
+    """ Starts the job loops, returns their tasks so they can be cancelled on shutdown """
+    return [asyncio.ensure_future(worker(store)) for _ in range(JOB_WORKERS)] + [asyncio.ensure_future(janitor(store))]
+
+async def wait_for_change(store: JobStore, job_id: str, previous: dict | None, timeout: float) -> dict | None:
+    """ Polls until the job's status, stage or progress differs from previous, or timeout passes """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await run_in_threadpool(store.get, job_id)
+        if job is None or job["status"] in FINISHED or previous is None:
+            return job
+        if (job["status"], job["stage"], job["progress"]) != (previous["status"], previous["stage"], previous["progress"]):
+            return job
+        if time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
@@ -1,6 +1,9 @@
+import asyncio
+import numpy as np
+
 # LLM
-from ollama import chat, ChatResponse
-from google import genai
+from router import Router
+from providers import ProviderError, get_provider
 
 # Memory + User management
 from tokens import TokenManager
@@ -11,6 +14,16 @@ from dotenv import load_dotenv
 from os.path import dirname, join
 from os import getenv
 
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Prompts carry the last MEMORY_RECENT_TURNS turns plus the MEMORY_TOP_K older turns most
+# relevant to the new message, instead of the whole history
+MEMORY_RECENT_TURNS = int(getenv("MEMORY_RECENT_TURNS", "10"))
+MEMORY_TOP_K = int(getenv("MEMORY_TOP_K", "4"))
+MEMORY_EMBED_BATCH = int(getenv("MEMORY_EMBED_BATCH", "64"))
+# Long turns are cut before embedding, the start says enough about what they were about
+MEMORY_EMBED_CHARS = int(getenv("MEMORY_EMBED_CHARS", "2000"))
+
 class LLM:
     def __init__(self) -> None:
         self.token_manager = TokenManager()
@@ -20,18 +33,22 @@ class LLM:
         load_dotenv(dotenv_path)    
         
         # Initialize variables
-        self.google_token = getenv("GOOGLE_API_KEY")
-        
-        self.provider = getenv("PROVIDER")
-        if self.provider is None:
-            self.provider = "ollama"
-        
-        self.model = getenv("model")
-        if self.model is None:
-            if self.provider == "ollama":
-                self.model = "gemma3:1b-it-qat"
-            elif self.provider == "google":
-                self.model = "gemma-3-27b-it"
+        self.provider_name = getenv("PROVIDER")
+        if self.provider_name is None:
+            self.provider_name = "ollama"
+
+        # Each provider falls back to its own default model when MODEL is unset,
+        # BACKENDS overrides both with a list of backends to hedge and fail over across
+        self.router = Router.from_env(self.provider_name, getenv("MODEL") or getenv("model"))
+
+        # Embeddings for memory retrieval, EMBED_PROVIDER=none keeps only the recent window
+        self.embedder = self._embedder(getenv("EMBED_PROVIDER") or self.provider_name)
+        if self.embedder is not None:
+            self.embed_model = getenv("EMBED_MODEL") or self.embedder.default_embed_model
+            self.index_name = f"{self.embedder.name}:{self.embed_model}:{self.memory.dimensions}"
+        # Saves duplicate embedding calls within this process, Memory.add_vectors keeps workers consistent
+        self._index_locks = {}
+        self._index_tasks = set()
         
         # Eliot, Enhanced Linux Interface & Operations Toolkit
         self.system = [
@@ -51,28 +68,6 @@ class LLM:
             },
         ]
     
-    def _convert_to_google_format(self, messages: list) -> list:
-        """
-        Converts a list of messages from the internal format to the Google GenAI format.
-        The Google API expects a list of dictionaries with 'role' and 'parts' keys.
-        """
-        google_format_messages = []
-        for message in messages:
-            # Google's API uses 'user' and 'model' for conversational roles.
-            role_map = {
-                "user": "user",
-                "assistant": "model"
-            }
-
-            # The 'system' role is not a valid conversational role for `generate_content`.
-            # This check ensures that system prompts are not included in the conversation history.
-            if message['role'] in role_map:
-                google_format_messages.append({
-                    "role": role_map[message['role']],
-                    "parts": [{"text": message['content']}]
-                })
-        return google_format_messages
-    
     def enroll_user(self, user: str) -> str:
         """ Enrolls a user based on name, returns a token """
         try:
@@ -95,116 +90,120 @@ class LLM:
             pass
     
     
-    def ask_ollama(self, prompt:str, token: str) -> str: 
-        """ Gets a response from the ollama provider, takes a prompt and a token to get memory file and name """
-        
-        messages = self.memory.memory_load(token)
+    def _get_user(self, token: str) -> str:
         try:
-            user = self.token_manager.get_user(token)
+            return self.token_manager.get_user(token)
         except ValueError as e:
             print(f"Token {token} is invalid: {e}")
             raise ValueError("Token is invalid")
-        
-        # save user input to memory
-        messages.append({
-            "role": "user",
-            "content": f"{user}: {prompt}"
-        })
-        
-        full_conversation = self.system + messages
-        response = chat(model=self.model, messages=full_conversation)
-        
-        # save assistant output to memory
-        messages.append({
-            "role": "assistant",
-            "content": response['message']['content']
-        })
-        
-        # save memory json to file
-        self.memory.memory_append(token, messages)
-        
-        return response['message']['content']
-    
-    def ask_google(self, prompt: str, token: str) -> str:
-        """ Gets a response from the google provider, takes a prompt and a token to get memory file and name """
 
-        messages = self.memory.memory_load(token)
-        try:
-            user = self.token_manager.get_user(token)
-        except ValueError as e:
-            print(f"Token {token} is invalid: {e}")
-            raise ValueError("Token is invalid")
-        
+    def _embedder(self, name: str):
+        if name == "none":
+            return None
+        provider = get_provider(name)
+        if not provider.supports_embeddings:
+            print(f"[!] {name} has no embeddings API, memory retrieval is off (set EMBED_PROVIDER)")
+            return None
+        return provider
+
+    async def _conversation(self, prompt: str, token: str) -> list:
+        """ The recent window and the older turns most relevant to the prompt, with the new user message appended """
+        user = self._get_user(token)
+
+        turns = self.memory.turn_count(token)
+        recent_start = max(0, turns - MEMORY_RECENT_TURNS)
+        messages = self.memory.messages(token, 2 * recent_start)
+        if recent_start and self.embedder is not None and MEMORY_TOP_K > 0:
+            messages = await self._recall(token, prompt, recent_start) + messages
+
         messages.append({
             "role": "user",
             "content": f"{user}: {prompt}"
         })
-        
-        full_conversation_for_google = self._convert_to_google_format(messages)
-        full_conversation_for_google.insert(0, {
-            "role": "model",
-            "parts": [{"text": self.system[0]['content']}]
-        })
+        return messages
 
+    async def _recall(self, token: str, prompt: str, before: int) -> list:
+        """ Messages of the turns before the recent window that best match the prompt, oldest first """
+        self.memory.check_model(token, self.index_name)
         try:
-            # Initialize the Google GenAI client and make the API call.
-            client = genai.Client(api_key=self.google_token)
-            response = client.models.generate_content(
-                model=self.model,
-                contents=full_conversation_for_google
-            )
-
-            # The response is an object, so we must access the text attribute to get the content.
-            assistant_response_content = response.text
-
-            # Append the assistant's response to the conversation memory.
-            messages.append({
-                "role": "assistant",
-                "content": assistant_response_content
-            })
-
-            # Save the updated conversation memory to the file.
-            self.memory.memory_append(token, messages)
-
-            # Return only the text of the assistant's response.
-            return assistant_response_content
-
-        except Exception as e:
-            # Handle potential errors during the API call gracefully.
-            print(f"An error occurred with the Google GenAI call: {e}")
-            return "An error occurred while generating the response."
-        
-    def ask(self, prompt: str, token: str) -> str:
-        """ Gets a response from the ollama provider, takes a prompt and a token to get memory file and name """
-        
-        if self.provider == "ollama":
-            return self.ask_ollama(prompt, token)
-        
-        elif self.provider == "google":
-            return self.ask_google(prompt, token)
+            [query] = await self.embedder.embed([prompt[:MEMORY_EMBED_CHARS]], self.embed_model)
+            hits = self.memory.search(token, query, MEMORY_TOP_K, before)
+        except (ProviderError, ValueError) as e:
+            print(f"[!] Memory retrieval skipped: {e}")
+            return []
+        return self.memory.turns(token, hits)
 
-        else:
-            raise ValueError("Provider is not supported")
-        
-    def prompt(self, prompt: str) -> str:
+    def _remember(self, token: str, messages: list, response: str) -> None:
+        # Only the new turn is written, the history on disk is append-only
+        self.memory.memory_append(token, [messages[-1], {
+            "role": "assistant",
+            "content": response
+        }])
+
+        if self.embedder is not None:
+            # Indexed in the background, the answer doesn't wait for the embedding
+            task = asyncio.ensure_future(self._index(token))
+            self._index_tasks.add(task)
+            task.add_done_callback(self._index_tasks.discard)
+
+    async def _index(self, token: str) -> None:
+        """ Embeds turns that have no vector yet, oldest first so vector n is always turn n """
+        lock = self._index_locks.setdefault(token, asyncio.Lock())
+        async with lock:
+            self.memory.check_model(token, self.index_name)
+            # Normally just the new turn, more after a model change or for histories from before the index
+            while (start := self.memory.vector_count(token)) < (turns := self.memory.turn_count(token)):
+                end = min(turns, start + MEMORY_EMBED_BATCH)
+                messages = self.memory.turns(token, range(start, end))
+                texts = [
+                    "\n".join(message["content"] for message in messages[i:i + 2])[:MEMORY_EMBED_CHARS]
+                    for i in range(0, len(messages), 2)
+                ]
+                try:
+                    vectors = await self.embedder.embed(texts, self.embed_model)
+                    self.memory.add_vectors(token, start, np.asarray(vectors, np.float32))
+                except (ProviderError, ValueError) as e:
+                    # The missing turns are picked up on the next one
+                    print(f"[!] Memory indexing failed: {e}")
+                    return
+
+    async def ask(self, prompt: str, token: str) -> dict:
+        """
+        Gets a response from the configured backends, takes a prompt and a token to get memory file and name.
+        Returns the message and the backend that produced it.
+        """
+
+        messages = await self._conversation(prompt, token)
+        response, backend = await self.router.chat(self.system + messages)
+        self._remember(token, messages, response)
+
+        return {"message": response, "backend": backend}
+
+    async def ask_stream(self, prompt: str, token: str) -> tuple:
+        """
+        Streaming version of ask, returns an async iterator of response chunks and the backend name.
+        Memory is saved once the stream completes.
+        """
+
+        messages = await self._conversation(prompt, token)
+        stream = await self.router.stream(self.system + messages)
+
+        async def chunks():
+            parts = []
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+            self._remember(token, messages, "".join(parts))
+
+        return chunks(), stream.backend.name
+
+    async def prompt(self, prompt: str) -> str:
         ''' Accepts an input string and returns the response as a string. '''
-        
-        if self.provider == "ollama":
-            response: ChatResponse = chat(model=self.model, messages=[
+
+        response, _ = await self.router.chat([
             {
                 'role': 'user',
                 'content': prompt,
             },
-            ])
-            return response['message']['content']
-        
-        elif self.provider == "google":
-            client = genai.Client(api_key=self.google_token)
-            response = client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            return response.text
-
-        else:
-            raise ValueError("Provider is not supported")
+        ])
+        return response
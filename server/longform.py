@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+import wave
+import numpy as np
+import webrtcvad
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+from audio_io import SAMPLE_RATE, load_pcm16
+from models import _flag
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Long recordings are split at VAD silences into windows of about LONGFORM_WINDOW_SECONDS,
+# each padded by LONGFORM_OVERLAP_SECONDS on both sides, and transcribed in parallel by a
+# pool of processes that each hold their own whisper model. Segments are stitched back by
+# timestamp: a segment belongs to the window whose unpadded span contains its midpoint, so
+# words heard twice in an overlap are kept once.
+#
+# The pool holds LONGFORM_WORKERS whisper models of its own. Run it in the inference service
+# (INFERENCE_SOCKET) so that cost is paid once per node: without it every API worker starts
+# its own pool.
+
+LONGFORM_MIN_SECONDS = float(getenv("LONGFORM_MIN_SECONDS", "600"))
+LONGFORM_WINDOW_SECONDS = float(getenv("LONGFORM_WINDOW_SECONDS", "120"))
+LONGFORM_OVERLAP_SECONDS = float(getenv("LONGFORM_OVERLAP_SECONDS", "1"))
+LONGFORM_MIN_SILENCE = float(getenv("LONGFORM_MIN_SILENCE", "0.3"))
+LONGFORM_VAD_AGGRESSIVENESS = int(getenv("LONGFORM_VAD_AGGRESSIVENESS", "2"))
+# Workers x threads should roughly match the core count, each worker holds a whisper model
+LONGFORM_THREADS = int(getenv("LONGFORM_THREADS") or getenv("WHISPER_THREADS") or "2") or 2
+LONGFORM_WORKERS = int(getenv("LONGFORM_WORKERS", str(max(1, (os.cpu_count() or 1) // LONGFORM_THREADS))))
+
+FRAME = SAMPLE_RATE * 30 // 1000  # webrtcvad accepts 10, 20 or 30 ms frames
+
+def wav_duration(wav_path: str) -> float:
+    with wave.open(wav_path, "rb") as f:
+        return f.getnframes() / f.getframerate()
+
+def is_long(wav_path: str) -> bool:
+    return wav_duration(wav_path) >= LONGFORM_MIN_SECONDS
+
+def speech_frames(pcm: np.ndarray) -> np.ndarray:
+    """ One speech / non-speech flag per 30 ms frame """
+    vad = webrtcvad.Vad(LONGFORM_VAD_AGGRESSIVENESS)
+    count = len(pcm) // FRAME
+    data = pcm[:count * FRAME].tobytes()
+    step = FRAME * 2  # bytes per frame
+    return np.fromiter(
+        (vad.is_speech(data[i * step:(i + 1) * step], SAMPLE_RATE) for i in range(count)),
+        dtype=bool,
+        count=count,
+    )
+
+def silence_cuts(speech: np.ndarray) -> np.ndarray:
+    """ Sample positions at the middle of every silence at least LONGFORM_MIN_SILENCE long """
+    min_frames = max(1, int(LONGFORM_MIN_SILENCE * 1000 / 30))
+    # Pad with speech so every silence run has both a start and an end edge
+    edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    long_enough = ends - starts >= min_frames
+    return ((starts[long_enough] + ends[long_enough]) // 2) * FRAME
+
+def plan_windows(pcm: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """
+    Returns (start, end, core_start, core_end) sample positions per window.
+    Cores tile the recording without gaps, start/end add the overlap around them.
+    """
+    total = len(pcm)
+    window = int(LONGFORM_WINDOW_SECONDS * SAMPLE_RATE)
+    overlap = int(LONGFORM_OVERLAP_SECONDS * SAMPLE_RATE)
+    cuts = silence_cuts(speech_frames(pcm))
+
+    boundaries = [0]
+    while total - boundaries[-1] > window * 1.5:
+        target = boundaries[-1] + window
+        # Nearest silence within half a window of the target, else a hard cut
+        nearby = cuts[(cuts > boundaries[-1] + window // 2) & (cuts < target + window // 2)]
+        boundaries.append(int(nearby[np.argmin(np.abs(nearby - target))]) if len(nearby) else target)
+    boundaries.append(total)
+
+    return [
+        (max(0, core_start - overlap), min(total, core_end + overlap), core_start, core_end)
+        for core_start, core_end in zip(boundaries, boundaries[1:])
+    ]
+
+# Worker process state
+_model = None
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _model
+    import torch
+    import whisper
+    if threads:
+        torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name)
+
+def _transcribe_window(shm_name: str, length: int, start: int, end: int) -> list:
+    shm = SharedMemory(name=shm_name)
+    try:
+        pcm = np.ndarray((length,), np.int16, buffer=shm.buf)
+        # astype copies, so the shared buffer is released before the slow part
+        samples = pcm[start:end].astype(np.float32) / 32768.0
+        del pcm
+    finally:
+        shm.close()
+
+    result = _model.transcribe(samples, language="en", verbose=False)
+    offset = start / SAMPLE_RATE
+    return [(segment["start"] + offset, segment["end"] + offset, segment["text"]) for segment in result["segments"]]
+
+def _ready() -> None:
+    # Keeps a worker busy briefly so warm-up tasks spread over all of them
+    time.sleep(0.5)
+
+# Set by the inference service, a pool anywhere else is per API worker
+in_service = False
+
+class WindowPool:
+    """
+    The worker processes behind long-form transcription, with the same residency settings as a models.ModelSlot:
+        LONGFORM_RESIDENT=false       true starts the workers with the service and keeps them
+        LONGFORM_IDLE_SECONDS=600     otherwise they are shut down, freeing their models, after this long unused
+    """
+
+    def __init__(self) -> None:
+        self.resident = _flag(getenv("LONGFORM_RESIDENT", "false"))
+        self.idle_seconds = float(getenv("LONGFORM_IDLE_SECONDS", "600"))
+        self.lock = threading.Lock()
+        self.executor = None
+        self.active = 0
+        self.last_used = time.monotonic()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # Called with the lock held
+        if self.executor is None:
+            print(f"[⏳] Starting {LONGFORM_WORKERS} long-form transcription workers...")
+            if not in_service:
+                print("[!] Long-form workers are running inside an API worker, each API worker loads its own; set INFERENCE_SOCKET to share them")
+            # spawn, not fork: the parent already runs model threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=LONGFORM_WORKERS,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(getenv("WHISPER_MODEL", "small"), LONGFORM_THREADS),
+            )
+        return self.executor
+
+    def acquire(self) -> ProcessPoolExecutor:
+        """ The running pool, started if needed. Pair with release() so it isn't reaped mid-use """
+        with self.lock:
+            executor = self._start()
+            self.active += 1
+            return executor
+
+    def release(self) -> None:
+        with self.lock:
+            self.active -= 1
+            self.last_used = time.monotonic()
+
+    def preload(self) -> None:
+        if not self.resident:
+            return
+        executor = self.acquire()
+        try:
+            # Waits until the workers have loaded their models
+            list(executor.map(_ready, range(LONGFORM_WORKERS)))
+        finally:
+            self.release()
+
+    def reap(self) -> None:
+        with self.lock:
+            if self.resident or self.executor is None or self.active:
+                return
+            if time.monotonic() - self.last_used < self.idle_seconds:
+                return
+            executor, self.executor = self.executor, None
+        print("[💤] Stopping idle long-form transcription workers")
+        executor.shutdown(wait=False)
+
+pool = WindowPool()
+
+def transcribe_long(wav_path: str, progress=None) -> dict:
+    """
+    Transcribes a 16 kHz mono wav window by window across the process pool.
+    Returns {"text", "segments"} like whisper. progress, if given, is called with the fraction of windows done.
+    """
+    pcm = load_pcm16(wav_path)
+    windows = plan_windows(pcm)
+    print(f"[🪟] Transcribing {len(pcm) / SAMPLE_RATE:.0f}s in {len(windows)} windows on {LONGFORM_WORKERS} workers")
+
+    # Workers read their window straight from shared memory
+    shm = SharedMemory(create=True, size=max(1, pcm.nbytes))
+    np.ndarray(pcm.shape, np.int16, buffer=shm.buf)[...] = pcm
+    length = len(pcm)
+    del pcm
+
+    results = [None] * len(windows)
+    try:
+        executor = pool.acquire()
+        try:
+            futures = {
+                executor.submit(_transcribe_window, shm.name, length, start, end): index
+                for index, (start, end, _, _) in enumerate(windows)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(done / len(windows))
+        finally:
+            pool.release()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    segments = []
+    for (_, _, core_start, core_end), window_segments in zip(windows, results):
+        low, high = core_start / SAMPLE_RATE, core_end / SAMPLE_RATE
+        for start, end, text in window_segments:
+            if low <= (start + end) / 2 < high:
+                segments.append({"start": start, "end": end, "text": text})
+
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
@@ -1,23 +1,45 @@
 # Fastapi
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from pydantic import BaseModel
 
 # llm
 from llm import LLM
+from providers import PROVIDER_UNAVAILABLE, ProviderError, close_client
 
 # Audio
-import audio as audio
-import hashlib
-import os
-from fastapi import UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from inference import engine
+from fastapi import HTTPException, Request
+from uploads import UploadLimitMiddleware, save_upload, delete_file
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import pipeline
+
+# Jobs
+import json
+import jobs
 
 # Tokens
 from tokens import TokenManager
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # No-op when models run in the shared inference service
+    await run_in_threadpool(engine.preload_models)
+    job_tasks = jobs.start(job_store)
+    yield
+    for task in job_tasks:
+        task.cancel()
+    # Release pooled provider connections
+    await close_client()
+
+app = FastAPI(lifespan=lifespan)
+# Oversized uploads are refused before they are fully received
+app.add_middleware(UploadLimitMiddleware)
 model = LLM()
 tokenManage = TokenManager()
+job_store = jobs.JobStore()
 
 # TODO: Return valid routes (not subroutes)
 @app.get("/")
@@ -29,6 +51,7 @@ async def root():
             "/remove": "Remove a user from the database",
             "/messages/*": "Multiply query related endpoints",
             "/audio/*": "Multiple audio endpoints",
+            "/jobs/*": "Background jobs for long audio",
         }
     }
 
@@ -57,6 +80,7 @@ async def messages_root():
     return {
         "message": {
             "/messages/ask": "Query the AI",
+            "/messages/ask/stream": "Query the AI and stream the response as plain text",
             "/messages/enroll": "Enrolls a user for and returns a token, also supports adding embeddings to a person",
         }
     }
@@ -64,9 +88,24 @@ async def messages_root():
 @app.post("/messages/ask")
 async def ask(request: PromptRequest):
     try:
-        return {"message": model.ask(request.prompt, request.token)}
+        return await model.ask(request.prompt, request.token)
     except ValueError as e:
         return {"error": f"Token {request.token} is invalid: {e}"}
+    except ProviderError as e:
+        print(f"[!] Provider error: {e}")
+        return {"error": PROVIDER_UNAVAILABLE}
+
+@app.post("/messages/ask/stream")
+async def ask_stream(request: PromptRequest):
+    try:
+        chunks, backend = await model.ask_stream(request.prompt, request.token)
+    except ValueError as e:
+        return {"error": f"Token {request.token} is invalid: {e}"}
+    except ProviderError as e:
+        print(f"[!] Provider error: {e}")
+        return {"error": PROVIDER_UNAVAILABLE}
+
+    return StreamingResponse(chunks, media_type="text/plain; charset=utf-8", headers={"X-Backend": backend})
 
 @app.post("/messages/enroll")
 async def enroll(request: EnrollRequest):
@@ -80,89 +119,133 @@ async def enroll(request: EnrollRequest):
 async def audio_root():
     return {
         "message": {
-            "/audio/transcribe": "Transcribes an mp3 file and returns the transcript",
+            "/audio/transcribe": "Transcribes an audio file (mp3, wav, flac, opus) and returns the transcript",
             "/audio/enroll": "Enrolls a user for voice identification, also supports adding embeddings to a person",
-            "/audio/transcribe_identify": "Transcribes an mp3 audio file and also sends the user identified",
-            "/audio/tts": "Converts text to speech using Google TTS"
+            "/audio/transcribe_identify": "Transcribes an audio file and also sends the user identified",
+            "/audio/tts": "Converts text to speech using Google TTS",
+            "/audio/ask": "Identifies the speaker, transcribes and answers in one request, streaming text and speech"
         }
     }
 
-# send audio file, auto converts to working formats, transcribes
-def save_file_with_hash(file_bytes: bytes, ext: str) -> str:
-    h = hashlib.sha256(file_bytes).hexdigest()
-    filename = f"/tmp/{h}.{ext}"
-    if not os.path.exists(filename):
-        with open(filename, "wb") as f:
-            f.write(file_bytes)
-    return filename
-
-def delete_file(path: str):
-    try:
-        os.remove(path)
-    except Exception:
-        pass  # silently ignore errors on delete
+def delete_upload(file_path: str):
+    """ Removes an upload along with the wav the audio module decoded it to """
+    delete_file(file_path)
+    delete_file(engine.wav_path_for(file_path))
 
 @app.post("/audio/transcribe")
-async def audio_transcribe(file: UploadFile = File(...)):
-    file_bytes = await file.read()
-    ext = file.filename.split(".")[-1].lower()
-
-    if ext not in ("mp3", "wav"):
-        raise HTTPException(status_code=400, detail="Unsupported audio format")
-
-    file_path = save_file_with_hash(file_bytes, ext)
+async def audio_transcribe(request: Request, long_audio: bool | None = None):
+    """
+    Multipart form with the audio as "file".
+    long_audio forces (true) or disables (false) parallel windowed transcription, by default it is used past LONGFORM_MIN_SECONDS
+    """
+    file_path, _ = await save_upload(request)
     try:
-        # Assuming your audio.transcribe expects a file path
-        transcript = audio.transcribe(file_path)  
+        # Model calls block, keep them off the event loop
+        transcript = await run_in_threadpool(engine.transcribe, file_path, long_audio=long_audio)
         return {"transcript": transcript}
     finally:
-        delete_file(file_path)
+        delete_upload(file_path)
 
 @app.post("/audio/enroll")
-async def audio_enroll(
-    file: UploadFile = File(...),
-    token: str = Form(...)
-):
-    file_bytes = await file.read()
-    ext = file.filename.split(".")[-1].lower()
-
-    if ext not in ("mp3", "wav"):
-        raise HTTPException(status_code=400, detail="Unsupported audio format")
-
-    file_path = save_file_with_hash(file_bytes, ext)
+async def audio_enroll(request: Request):
+    """ Multipart form with the audio as "file" and the user's "token" """
+    file_path, fields = await save_upload(request)
     try:
+        token = fields.get("token")
+        if not token:
+            raise HTTPException(status_code=422, detail="token is required")
         # enroll_speaker expects a name and a file path
-        audio.enroll_speaker(token, file_path)
+        await run_in_threadpool(engine.enroll_speaker, token, file_path)
         return {"message": f"User {token} enrolled successfully."}
     finally:
-        delete_file(file_path)
+        delete_upload(file_path)
 
 @app.post("/audio/transcribe_identify")
-async def audio_transcribe_identify(file: UploadFile = File(...)):
-    file_bytes = await file.read()
-    ext = file.filename.split(".")[-1].lower()
-
-    if ext not in ("mp3", "wav"):
-        raise HTTPException(status_code=400, detail="Unsupported audio format")
-
-    file_path = save_file_with_hash(file_bytes, ext)
+async def audio_transcribe_identify(request: Request, long_audio: bool | None = None, diarize: bool | None = None):
+    """
+    Multipart form with the audio as "file".
+    diarize=true always runs full diarization, by default short or single speaker clips skip it (see "path" in the result)
+    """
+    file_path, _ = await save_upload(request)
     try:
-        result = audio.classify_and_transcribe(file_path)
+        result = await run_in_threadpool(engine.classify_and_transcribe, file_path, long_audio=long_audio, diarize=diarize)
         return result
     finally:
-        delete_file(file_path)
-
-def delete_file(path: str):
-    try:
-        os.remove(path)
-    except Exception as e:
-        print(f"Error deleting file: {e}")
+        delete_upload(file_path)
+
+@app.post("/audio/ask")
+async def audio_ask(request: Request):
+    """
+    Voice in, answer out: streams NDJSON events with the text, per sentence mp3 audio and stage timings.
+    Multipart form with the audio as "file" and optionally a "token", otherwise the speaker is identified by voice.
+    """
+    file_path, fields = await save_upload(request)
+    return StreamingResponse(
+        pipeline.voice_ask(model, file_path, fields.get("token") or None),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(delete_upload, file_path),
+    )
 
 @app.post("/audio/tts")
-async def audio_tts(text: str, background_tasks: BackgroundTasks):
-    filepath = audio.tts(text)  # Generate the MP3 file
-    background_tasks.add_task(delete_file, filepath)
-    return FileResponse(filepath, media_type="audio/mpeg", filename="output.mp3")
+async def audio_tts(text: str):
+    # In memory, a file named by the text's hash would be shared with concurrent requests for the same text
+    audio = await run_in_threadpool(engine.tts_bytes, text)
+    return Response(audio, media_type="audio/mpeg", headers={"Content-Disposition": 'attachment; filename="output.mp3"'})
+
+@app.get("/jobs")
+async def jobs_root():
+    return {
+        "message": {
+            "/jobs/transcribe": "Queues a transcription, returns a job ID immediately",
+            "/jobs/transcribe_identify": "Queues a transcription with speaker identification, returns a job ID immediately",
+            "/jobs/{job_id}": "Job status, progress and result, ?wait=N long-polls up to N seconds for a change",
+            "/jobs/{job_id}/events": "Server-sent events with the job's stage and progress until it finishes",
+        }
+    }
+
+async def submit_job(kind: str, request: Request) -> dict:
+    file_path, _ = await save_upload(request, directory=jobs.JOBS_DIR)
+    job_id = await run_in_threadpool(job_store.create, kind, file_path)
+    return {"job_id": job_id}
+
+@app.post("/jobs/transcribe")
+async def jobs_transcribe(request: Request):
+    return await submit_job("transcribe", request)
+
+@app.post("/jobs/transcribe_identify")
+async def jobs_transcribe_identify(request: Request):
+    return await submit_job("transcribe_identify", request)
+
+@app.get("/jobs/{job_id}")
+async def jobs_status(job_id: str, wait: float = 0):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is not None and wait > 0:
+        job = await jobs.wait_for_change(job_store, job_id, job, min(wait, 60))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def jobs_events(job_id: str):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        current = job
+        yield f"data: {json.dumps(current)}\n\n"
+        while current["status"] not in jobs.FINISHED:
+            latest = await jobs.wait_for_change(job_store, job_id, current, 15)
+            if latest is None:
+                break
+            if latest == current:
+                # Keeps load balancers from timing out an idle stream
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(latest)}\n\n"
+            current = latest
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,27 +1,227 @@
+import fcntl
 import json
-from os import makedirs, remove
-from os.path import exists, join
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from os import SEEK_END, makedirs, remove
+from os.path import exists, join, getsize
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Vectors are cut to this many dimensions (the usual embedding models are trained so the
+# leading dimensions carry most of the meaning) and stored as float16
+MEMORY_DIMENSIONS = int(getenv("MEMORY_DIMENSIONS", "256"))
+# RAM per API worker for the float32 search copies of users' vectors, least recently searched
+# users are dropped first (100k turns at 256 dimensions take about 100 MB)
+MEMORY_CACHE_BYTES = int(float(getenv("MEMORY_CACHE_MB", "512")) * 1024 * 1024)
+
+VECTOR_DTYPE = np.float16
+
+def _unit(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """ Truncates to dimensions and scales every row to unit length, so a dot product is the cosine similarity """
+    vectors = np.atleast_2d(np.asarray(vectors, np.float32))
+    if vectors.shape[1] < dimensions:
+        raise ValueError(f"Embeddings have {vectors.shape[1]} dimensions, MEMORY_DIMENSIONS is {dimensions}")
+    vectors = vectors[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class _Vectors:
+    """ One user's vectors as a float32 matrix with spare capacity, appended to as the file grows """
+
+    def __init__(self, dimensions: int) -> None:
+        self.data = np.empty((0, dimensions), np.float32)
+        self.count = 0
+
+    def extend(self, rows: np.ndarray) -> None:
+        needed = self.count + len(rows)
+        if needed > len(self.data):
+            # A quarter spare keeps appends amortized without doubling the footprint
+            grown = np.empty((max(needed + needed // 4, 1024), self.data.shape[1]), np.float32)
+            grown[:self.count] = self.data[:self.count]
+            self.data = grown
+        self.data[self.count:needed] = rows
+        self.count = needed
 
 class Memory:
-    def __init__(self, path: str | None = "memories") -> None:
+    """
+    Per token conversation memory, append-only on disk:
+        <token>.jsonl    one message per line
+        <token>.offsets  int64 byte offset of every line, so any range is read without a scan
+        <token>.vectors  float16 unit vectors, one per turn (a user message and its reply)
+        <token>.meta     the embedding model behind the vectors, a different model restarts the index
+    <token>.lock     flock held by every writer, API worker processes share the files
+    Older <token>.json files are converted on first use.
+    """
+
+    def __init__(self, path: str | None = "memories", dimensions: int = MEMORY_DIMENSIONS, cache_bytes: int = MEMORY_CACHE_BYTES) -> None:
         self.path = path
-        
+        self.dimensions = dimensions
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+
         if not exists(path):
             makedirs(path)
-    
-    def memory_load(self, token: str) -> list:
-        try:
-            with open(join(self.path, f"{token}.json"), "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
+
+    def _file(self, token: str, ext: str) -> str:
+        return join(self.path, f"{token}.{ext}")
+
+    @contextmanager
+    def _locked(self, token: str):
+        """ Exclusive across threads and processes, each holder opens its own lock file description """
+        with open(self._file(token, "lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _migrate(self, token: str) -> None:
+        legacy = self._file(token, "json")
+        if not exists(legacy) or exists(self._file(token, "jsonl")):
+            return
+        with self._locked(token):
+            # Another worker may have converted it while we waited
+            if not exists(legacy) or exists(self._file(token, "jsonl")):
+                return
+            with open(legacy, "r") as f:
+                messages = json.load(f)
+            self._append(token, messages)
+            remove(legacy)
+
+    def _offsets(self, token: str) -> np.ndarray:
+        path = self._file(token, "offsets")
+        if not exists(path) or getsize(path) == 0:
+            return np.zeros(0, np.int64)
+        return np.memmap(path, np.int64, mode="r")
+
+    def message_count(self, token: str) -> int:
+        self._migrate(token)
+        path = self._file(token, "offsets")
+        return getsize(path) // 8 if exists(path) else 0
+
+    def turn_count(self, token: str) -> int:
+        return self.message_count(token) // 2
+
+    def messages(self, token: str, start: int = 0, end: int | None = None) -> list:
+        """ Messages start to end (exclusive), read straight from their byte range """
+        self._migrate(token)
+        offsets = self._offsets(token)
+        end = len(offsets) if end is None else min(end, len(offsets))
+        if start >= end:
             return []
-         
+
+        with open(self._file(token, "jsonl"), "rb") as f:
+            f.seek(int(offsets[start]))
+            data = f.read(int(offsets[end]) - int(offsets[start])) if end < len(offsets) else f.read()
+        return [json.loads(line) for line in data.splitlines()[:end - start]]
+
+    def turns(self, token: str, turns) -> list:
+        """ The messages of the given turn numbers, in the order given """
+        messages = []
+        for turn in turns:
+            messages.extend(self.messages(token, 2 * turn, 2 * turn + 2))
+        return messages
+
+    def memory_load(self, token: str) -> list:
+        return self.messages(token)
+
     def memory_append(self, token: str, memory: list) -> None:
-        with open(join(self.path, f"{token}.json"), "w") as f:
-            json.dump(memory, f, indent=4)
+        """ Appends messages to the token's history """
+        with self._locked(token):
+            self._append(token, memory)
+
+    def _append(self, token: str, memory: list) -> None:
+        # Called with the token locked, so the end of the file is where these lines land
+        offsets = []
+        with open(self._file(token, "jsonl"), "ab") as f:
+            position = f.seek(0, SEEK_END)
+            for message in memory:
+                line = (json.dumps(message) + "\n").encode()
+                offsets.append(position)
+                position += len(line)
+                f.write(line)
+        with open(self._file(token, "offsets"), "ab") as f:
+            f.write(np.array(offsets, np.int64).tobytes())
 
     def memory_delete(self, token: str) -> None:
-        try:
-            remove(join(self.path, f"{token}.json"))
-        except FileNotFoundError:
-            pass
+        self._cache.pop(token, None)
+        # The lock file stays, another worker may be waiting on it
+        with self._locked(token):
+            for ext in ("json", "jsonl", "offsets", "vectors", "meta"):
+                try:
+                    remove(self._file(token, ext))
+                except FileNotFoundError:
+                    pass
+
+    def check_model(self, token: str, model: str) -> None:
+        """ Drops the token's vectors if they came from a different embedding model """
+        path = self._file(token, "meta")
+        if self._model(path) == model:
+            return
+        with self._locked(token):
+            if self._model(path) == model:
+                return
+            self._cache.pop(token, None)
+            try:
+                remove(self._file(token, "vectors"))
+            except FileNotFoundError:
+                pass
+            with open(path, "w") as f:
+                f.write(model)
+
+    def _model(self, path: str) -> str | None:
+        if not exists(path):
+            return None
+        with open(path, "r") as f:
+            return f.read().strip()
+
+    def vector_count(self, token: str) -> int:
+        path = self._file(token, "vectors")
+        return getsize(path) // (self.dimensions * VECTOR_DTYPE().itemsize) if exists(path) else 0
+
+    def add_vectors(self, token: str, start: int, vectors) -> None:
+        """ Appends the vectors of turns start onwards, ignored unless they continue where the index ends """
+        rows = _unit(vectors, self.dimensions).astype(VECTOR_DTYPE)
+        # Checked under the lock, so two workers indexing the same turns can't both append
+        with self._locked(token):
+            if start != self.vector_count(token):
+                return
+            with open(self._file(token, "vectors"), "ab") as f:
+                f.write(rows.tobytes())
+
+    def _vectors(self, token: str) -> _Vectors:
+        """ The token's vectors in RAM, reading only rows added since the last search """
+        vectors = self._cache.pop(token, None)
+        count = self.vector_count(token)
+        if vectors is None or count < vectors.count:
+            vectors = _Vectors(self.dimensions)
+
+        if count > vectors.count:
+            row_bytes = self.dimensions * VECTOR_DTYPE().itemsize
+            with open(self._file(token, "vectors"), "rb") as f:
+                f.seek(vectors.count * row_bytes)
+                rows = np.frombuffer(f.read((count - vectors.count) * row_bytes), VECTOR_DTYPE)
+            vectors.extend(rows.reshape(-1, self.dimensions))
+
+        # Least recently searched users are dropped first, the one searching now always stays
+        self._cache[token] = vectors
+        while len(self._cache) > 1 and sum(cached.data.nbytes for cached in self._cache.values()) > self.cache_bytes:
+            self._cache.popitem(last=False)
+        return vectors
+
+    def search(self, token: str, query, k: int, before: int) -> list:
+        """ The k turns numbered below before that are most similar to query, oldest first """
+        vectors = self._vectors(token)
+        count = min(vectors.count, before)
+        if count == 0 or k <= 0:
+            return []
+
+        scores = vectors.data[:count] @ _unit(query, self.dimensions)[0]
+        top = np.argpartition(scores, -k)[-k:] if count > k else np.arange(count)
+        return sorted(int(turn) for turn in top)
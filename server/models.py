@@ -0,0 +1,89 @@
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+class ModelSlot:
+    """
+    Holds one model and the single thread that runs it.
+
+    Calls are serialized on that thread (whisper installs per call hooks, so calls must not overlap)
+    and the thread carries the model's own torch thread budget: with OpenMP builds
+    torch.set_num_threads only applies to the calling thread.
+
+    Configured per model from the environment, e.g. for "whisper":
+        WHISPER_THREADS=4          torch intra-op threads, 0 keeps the torch default
+        WHISPER_RESIDENT=true      load at startup and never unload
+        WHISPER_IDLE_SECONDS=600   when not resident, unload after this long unused
+    """
+
+    def __init__(self, name: str, loader) -> None:
+        self.name = name
+        self.loader = loader
+
+        prefix = name.upper()
+        self.threads = int(getenv(f"{prefix}_THREADS", "0"))
+        self.resident = _flag(getenv(f"{prefix}_RESIDENT", "true"))
+        self.idle_seconds = float(getenv(f"{prefix}_IDLE_SECONDS", "600"))
+
+        self.model = None
+        self.last_used = time.monotonic()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"model-{name}", initializer=self._init_thread)
+
+    def _init_thread(self) -> None:
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+
+    def _load(self):
+        if self.model is None:
+            print(f"[⏳] Loading {self.name} model...")
+            self.model = self.loader()
+        return self.model
+
+    def _call(self, func, args):
+        try:
+            return func(self._load(), *args)
+        finally:
+            self.last_used = time.monotonic()
+
+    def _unload_if_idle(self) -> None:
+        if self.resident or self.model is None:
+            return
+        if time.monotonic() - self.last_used < self.idle_seconds:
+            return
+        print(f"[💤] Unloading idle {self.name} model")
+        self.model = None
+        gc.collect()
+
+    def run(self, func, *args):
+        """ Runs func(model, *args) on the model's thread, loading the model first if needed """
+        return self.executor.submit(self._call, func, args).result()
+
+    def preload(self) -> None:
+        if self.resident:
+            self.executor.submit(self._load).result()
+
+    def reap(self) -> None:
+        # Runs on the model thread so it can't race a call in progress
+        self.executor.submit(self._unload_if_idle)
+
+def start_reaper(slots: list, interval: float = 30) -> None:
+    """ Periodically unloads idle non-resident models """
+    def loop():
+        while True:
+            time.sleep(interval)
+            for slot in slots:
+                slot.reap()
+
+    threading.Thread(target=loop, name="model-reaper", daemon=True).start()
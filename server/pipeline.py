@@ -0,0 +1,150 @@
+import asyncio
+import base64
+import json
+import re
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from inference import engine
+from providers import PROVIDER_UNAVAILABLE, ProviderError
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Voice to answer in one request:
+#   decode once -> identify speaker + transcribe (side by side) -> ask the LLM with history
+#   -> speak each sentence as soon as it is complete
+# Everything is streamed back as newline delimited JSON events:
+#   {"type": "stage", "stage": ..., "seconds": ...}   time since the stage group started
+#   {"type": "speaker", "user": ..., "confidence": ...}
+#   {"type": "transcript", "text": ...}
+#   {"type": "backend", "backend": ...}
+#   {"type": "text", "text": ...}                      answer chunks as generated
+#   {"type": "audio", "index": n, "data": base64 mp3}  one per sentence, in order
+#   {"type": "error", "error": ...}
+#   {"type": "done", "timings": {...}}
+
+SPEAKER_MATCH_THRESHOLD = float(getenv("SPEAKER_MATCH_THRESHOLD", "0.7"))
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def event(type: str, **data) -> str:
+    return json.dumps({"type": type, **data}) + "\n"
+
+def split_sentences(buffer: str) -> tuple[list, str]:
+    """ Splits off complete sentences, returns them and the unfinished remainder """
+    parts = SENTENCE_END.split(buffer)
+    return [part for part in parts[:-1] if part.strip()], parts[-1]
+
+async def timed(func, *args) -> tuple:
+    """ Runs a blocking stage in the threadpool, returns its result and duration """
+    since = time.perf_counter()
+    result = await run_in_threadpool(func, *args)
+    return result, round(time.perf_counter() - since, 4)
+
+async def voice_ask(model, audio_path: str, token: str | None = None):
+    """ Runs the voice pipeline for an uploaded file, yielding NDJSON events """
+    timings = {}
+    tasks = []
+
+    def stage(name: str, since: float) -> str:
+        timings[name] = round(time.perf_counter() - since, 4)
+        return event("stage", stage=name, seconds=timings[name])
+
+    started = time.perf_counter()
+    try:
+        samples = await run_in_threadpool(engine.load_samples, audio_path)
+        yield stage("decode", started)
+
+        # Identification and transcription only share the decoded samples, so they run side by side
+        since = time.perf_counter()
+        identify = None
+        if token is None:
+            identify = asyncio.ensure_future(timed(engine.identify_speaker, samples))
+            tasks.append(identify)
+        transcript = await run_in_threadpool(engine.transcribe_samples, samples)
+        yield stage("transcribe", since)
+
+        if identify is not None:
+            (token, confidence), timings["identify"] = await identify
+            yield event("stage", stage="identify", seconds=timings["identify"])
+            if token is None or confidence < SPEAKER_MATCH_THRESHOLD:
+                yield event("error", error="Speaker not recognised, enroll your voice or pass a token")
+                return
+        else:
+            confidence = 1.0
+
+        yield event("speaker", user=model.token_manager.get_user(token), confidence=confidence)
+        yield event("transcript", text=transcript)
+
+        since = time.perf_counter()
+        chunks, backend = await model.ask_stream(transcript, token)
+        yield event("backend", backend=backend)
+
+        queue = asyncio.Queue()
+        sentences = asyncio.Queue()
+
+        async def generate():
+            buffer = ""
+            first = True
+            try:
+                async for chunk in chunks:
+                    if first:
+                        await queue.put(stage("first_token", since))
+                        first = False
+                    await queue.put(event("text", text=chunk))
+
+                    complete, buffer = split_sentences(buffer + chunk)
+                    for sentence in complete:
+                        await sentences.put(asyncio.ensure_future(run_in_threadpool(engine.tts_bytes, sentence)))
+                if buffer.strip():
+                    await sentences.put(asyncio.ensure_future(run_in_threadpool(engine.tts_bytes, buffer)))
+                await queue.put(stage("answer", since))
+            finally:
+                await sentences.put(None)
+
+        async def speak():
+            index = 0
+            while (sentence := await sentences.get()) is not None:
+                tasks.append(sentence)
+                data = await sentence
+                if index == 0:
+                    await queue.put(stage("first_audio", since))
+                await queue.put(event("audio", index=index, data=base64.b64encode(data).decode()))
+                index += 1
+            await queue.put(stage("speech", since))
+
+        async def run():
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                await queue.put(None)
+
+        workers = [asyncio.ensure_future(generate()), asyncio.ensure_future(speak())]
+        tasks.extend(workers)
+        runner = asyncio.ensure_future(run())
+        tasks.append(runner)
+
+        while (item := await queue.get()) is not None:
+            yield item
+        await runner
+
+        timings["total"] = round(time.perf_counter() - started, 4)
+        yield event("done", timings=timings)
+    except ValueError as e:
+        yield event("error", error=str(e))
+    except ProviderError as e:
+        print(f"[!] Provider error: {e}")
+        yield event("error", error=PROVIDER_UNAVAILABLE)
+    except Exception as e:
+        # Headers are already sent, so report it in the stream rather than as a status code
+        print(f"[!] Voice pipeline failed: {e}")
+        yield event("error", error="Voice pipeline failed")
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,315 @@
+import json
+import httpx
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# One pooled keep-alive client is shared by every provider, so requests reuse
+# connections instead of paying a TCP/TLS handshake per prompt.
+_client: httpx.AsyncClient | None = None
+
+def get_client() -> httpx.AsyncClient:
+    """ Returns the shared async HTTP client, creating it on first use """
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=int(getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        )
+        timeout = httpx.Timeout(
+            float(getenv("HTTP_TIMEOUT", "120")),
+            connect=float(getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        )
+        _client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return _client
+
+async def close_client() -> None:
+    """ Closes the shared client, call on application shutdown """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+class ProviderError(Exception):
+    """ Raised when a provider call fails or returns an unexpected payload """
+
+# What API clients are told when every backend failed, the details are only logged
+PROVIDER_UNAVAILABLE = "The language model is unavailable, try again later"
+
+class Provider:
+    """
+    Base class for LLM backends.
+    Subclasses only translate the internal message format ({"role", "content"} dicts,
+    optionally starting with a system message) to and from their API.
+    """
+    name = ""
+    default_model = ""
+    default_embed_model = ""
+
+    def __init__(self, model: str | None = None) -> None:
+        self.model = model or self.default_model
+
+    def _request(self, messages: list) -> dict:
+        """ Returns the url, payload, headers and params for a streamed chat request """
+        raise NotImplementedError
+
+    def _parse_chunk(self, data: dict) -> str:
+        """ Extracts the text from one streamed event """
+        raise NotImplementedError
+
+    def _embed_request(self, texts: list, model: str) -> dict:
+        """ Returns the url, payload, headers and params for an embeddings request """
+        raise NotImplementedError
+
+    def _parse_embeddings(self, data: dict) -> list:
+        """ Extracts one vector per input text """
+        raise NotImplementedError
+
+    def _failure(self, e: Exception) -> ProviderError:
+        """
+        Logs the full error and returns one fit for API clients: status code or error type only.
+        httpx errors carry the request URL, which must not reach clients.
+        """
+        print(f"[!] {self.name} request failed: {e}")
+        if isinstance(e, httpx.HTTPStatusError):
+            detail = f"HTTP {e.response.status_code}"
+        elif isinstance(e, httpx.TimeoutException):
+            detail = "timed out"
+        else:
+            detail = type(e).__name__
+        return ProviderError(f"{self.name} request failed: {detail}")
+
+    def _unexpected(self, data) -> ProviderError:
+        print(f"[!] Unexpected {self.name} response: {data}")
+        return ProviderError(f"Unexpected {self.name} response")
+
+    @property
+    def supports_embeddings(self) -> bool:
+        return type(self)._embed_request is not Provider._embed_request
+
+    async def _post(self, request: dict, parse):
+        try:
+            response = await get_client().post(
+                request["url"], json=request["payload"],
+                headers=request.get("headers"), params=request.get("params"),
+            )
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            raise self._failure(e) from e
+
+        try:
+            return parse(data)
+        except (KeyError, IndexError, TypeError) as e:
+            raise self._unexpected(data) from e
+
+    async def embed(self, texts: list, model: str | None = None) -> list:
+        """ Embeds texts with the provider's embedding model, returns one vector (list of floats) per text """
+        return await self._post(self._embed_request(texts, model or self.default_embed_model), self._parse_embeddings)
+
+    async def stream(self, messages: list):
+        """ Yields the response text in chunks as the backend produces them """
+        request = self._request(messages)
+        try:
+            async with get_client().stream(
+                "POST", request["url"], json=request["payload"],
+                headers=request.get("headers"), params=request.get("params"),
+            ) as response:
+                response.raise_for_status()
+                async for data in self._events(response):
+                    try:
+                        chunk = self._parse_chunk(data)
+                    except (KeyError, IndexError, TypeError) as e:
+                        raise self._unexpected(data) from e
+                    if chunk:
+                        yield chunk
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            raise self._failure(e) from e
+
+    async def _events(self, response: httpx.Response):
+        """ Parses a server-sent events body, the format used by most hosted APIs """
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
+def _split_system(messages: list) -> tuple[str, list]:
+    """ Separates system messages from the conversational ones """
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    return system, [m for m in messages if m["role"] != "system"]
+
+class OllamaProvider(Provider):
+    name = "ollama"
+    default_model = "gemma3:1b-it-qat"
+    default_embed_model = "nomic-embed-text"
+
+    def __init__(self, model: str | None = None) -> None:
+        super().__init__(model)
+        self.host = getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+
+    def _request(self, messages: list) -> dict:
+        return {
+            "url": f"{self.host}/api/chat",
+            "payload": {"model": self.model, "messages": messages, "stream": True},
+        }
+
+    def _embed_request(self, texts: list, model: str) -> dict:
+        return {"url": f"{self.host}/api/embed", "payload": {"model": model, "input": texts}}
+
+    def _parse_embeddings(self, data: dict) -> list:
+        return data["embeddings"]
+
+    def _parse_chunk(self, data: dict) -> str:
+        if "error" in data:
+            raise self._unexpected(data)
+        return data.get("message", {}).get("content", "")
+
+    async def _events(self, response: httpx.Response):
+        # ollama streams newline delimited JSON rather than server-sent events
+        async for line in response.aiter_lines():
+            if line:
+                yield json.loads(line)
+
+class GoogleProvider(Provider):
+    name = "google"
+    default_model = "gemma-3-27b-it"
+    default_embed_model = "text-embedding-004"
+
+    def __init__(self, model: str | None = None) -> None:
+        super().__init__(model)
+        self.api_key = getenv("GOOGLE_API_KEY")
+        self.host = getenv("GOOGLE_API_HOST", "https://generativelanguage.googleapis.com").rstrip("/")
+
+    def _convert_to_google_format(self, messages: list) -> list:
+        """
+        Converts a list of messages from the internal format to the Google GenAI format.
+        The Google API expects a list of dictionaries with 'role' and 'parts' keys.
+        """
+        system, conversation = _split_system(messages)
+
+        # Google's API uses 'user' and 'model' for conversational roles.
+        role_map = {
+            "user": "user",
+            "assistant": "model"
+        }
+        contents = [
+            {"role": role_map[m["role"]], "parts": [{"text": m["content"]}]}
+            for m in conversation if m["role"] in role_map
+        ]
+
+        # Gemma models reject system instructions, so the system prompt is sent as the first model turn.
+        if system:
+            contents.insert(0, {"role": "model", "parts": [{"text": system}]})
+        return contents
+
+    def _headers(self) -> dict:
+        # In a header rather than the ?key= parameter, so the key never appears in a URL
+        return {"x-goog-api-key": self.api_key}
+
+    def _request(self, messages: list) -> dict:
+        return {
+            "url": f"{self.host}/v1beta/models/{self.model}:streamGenerateContent",
+            "payload": {"contents": self._convert_to_google_format(messages)},
+            "headers": self._headers(),
+            "params": {"alt": "sse"},
+        }
+
+    def _embed_request(self, texts: list, model: str) -> dict:
+        return {
+            "url": f"{self.host}/v1beta/models/{model}:batchEmbedContents",
+            "payload": {"requests": [{"model": f"models/{model}", "content": {"parts": [{"text": text}]}} for text in texts]},
+            "headers": self._headers(),
+        }
+
+    def _parse_embeddings(self, data: dict) -> list:
+        return [embedding["values"] for embedding in data["embeddings"]]
+
+    def _parse_chunk(self, data: dict) -> str:
+        if not data.get("candidates"):
+            return ""
+        return "".join(part.get("text", "") for part in data["candidates"][0].get("content", {}).get("parts", []))
+
+class OpenAIProvider(Provider):
+    name = "openai"
+    default_model = "gpt-4o-mini"
+    default_embed_model = "text-embedding-3-small"
+
+    def __init__(self, model: str | None = None) -> None:
+        super().__init__(model)
+        self.api_key = getenv("OPENAI_API_KEY")
+        self.host = getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+    def _request(self, messages: list) -> dict:
+        return {
+            "url": f"{self.host}/chat/completions",
+            "payload": {"model": self.model, "messages": messages, "stream": True},
+            "headers": {"Authorization": f"Bearer {self.api_key}"},
+        }
+
+    def _embed_request(self, texts: list, model: str) -> dict:
+        return {
+            "url": f"{self.host}/embeddings",
+            "payload": {"model": model, "input": texts},
+            "headers": {"Authorization": f"Bearer {self.api_key}"},
+        }
+
+    def _parse_embeddings(self, data: dict) -> list:
+        return [item["embedding"] for item in sorted(data["data"], key=lambda item: item["index"])]
+
+    def _parse_chunk(self, data: dict) -> str:
+        if not data.get("choices"):
+            return ""
+        return data["choices"][0].get("delta", {}).get("content") or ""
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+    default_model = "claude-3-5-haiku-latest"
+
+    def __init__(self, model: str | None = None) -> None:
+        super().__init__(model)
+        self.api_key = getenv("ANTHROPIC_API_KEY")
+        self.host = getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com").rstrip("/")
+        self.max_tokens = int(getenv("ANTHROPIC_MAX_TOKENS", "1024"))
+
+    def _request(self, messages: list) -> dict:
+        system, conversation = _split_system(messages)
+        payload = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "messages": conversation,
+            "stream": True,
+        }
+        if system:
+            payload["system"] = system
+        return {
+            "url": f"{self.host}/v1/messages",
+            "payload": payload,
+            "headers": {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"},
+        }
+
+    def _parse_chunk(self, data: dict) -> str:
+        if data.get("type") == "error":
+            raise self._unexpected(data)
+        if data.get("type") == "content_block_delta":
+            return data["delta"].get("text", "")
+        return ""
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (OllamaProvider, GoogleProvider, OpenAIProvider, AnthropicProvider)
+}
+
+def get_provider(name: str, model: str | None = None) -> Provider:
+    """ Builds a provider by name, raises ValueError if it is not supported """
+    try:
+        return PROVIDERS[name](model)
+    except KeyError:
+        raise ValueError("Provider is not supported")
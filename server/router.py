@@ -0,0 +1,258 @@
+import asyncio
+import time
+from collections import deque
+
+from providers import Provider, ProviderError, get_provider
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Routing across LLM backends:
+#   - every request starts on the first healthy backend (configured order)
+#   - if it hasn't produced a first token by the hedge deadline (a percentile of its
+#     recent first token latencies) a second request is sent to the next backend,
+#     whichever answers first wins and the other is cancelled
+#   - a cancelled request still counts towards the deadline: its time to first token is at
+#     least how long it ran, leaving it out would pull the percentile down with every hedge
+#   - a backend that errors fails over to the next one immediately
+#   - circuit breakers take backends with a high error or slow call rate out of rotation
+
+def percentile(samples, pct: float) -> float:
+    """
+    Percentile of (seconds, observed) samples, where unobserved ones are only lower bounds
+    (Kaplan-Meier). Falls back to the largest sample when too many are cut short to tell.
+    """
+    # At equal times an observed value is counted before the lower bounds it outlasted
+    ordered = sorted(samples, key=lambda sample: (sample[0], not sample[1]))
+    if not ordered:
+        return 0.0
+    remaining = 1.0
+    at_risk = len(ordered)
+    for seconds, observed in ordered:
+        if observed:
+            remaining *= 1 - 1 / at_risk
+            if 1 - remaining >= pct / 100:
+                return seconds
+        at_risk -= 1
+    return ordered[-1][0]
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self) -> None:
+        self.min_calls = int(getenv("BREAKER_MIN_CALLS", "10"))
+        self.error_rate = float(getenv("BREAKER_ERROR_RATE", "0.5"))
+        self.slow_seconds = float(getenv("BREAKER_SLOW_SECONDS", "10"))
+        self.slow_rate = float(getenv("BREAKER_SLOW_RATE", "0.5"))
+        self.cooldown = float(getenv("BREAKER_COOLDOWN", "30"))
+
+        # (ok, slow) for the most recent calls
+        self.calls = deque(maxlen=int(getenv("BREAKER_WINDOW", "50")))
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def available(self) -> bool:
+        """ Whether a request may be sent, an open breaker lets one trial through after the cooldown """
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == self.CLOSED
+
+    def start(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self.trial_in_flight = True
+
+    def record(self, ok: bool, latency: float) -> None:
+        slow = latency >= self.slow_seconds
+
+        if self.state == self.HALF_OPEN:
+            if ok and not slow:
+                self.state = self.CLOSED
+                self.calls.clear()
+            else:
+                self._trip()
+            self.trial_in_flight = False
+            return
+
+        if self.state == self.OPEN:
+            # Late result from a call started before the breaker tripped
+            return
+
+        self.calls.append((ok, slow))
+        if len(self.calls) < self.min_calls:
+            return
+
+        errors = sum(1 for ok, _ in self.calls if not ok) / len(self.calls)
+        slows = sum(1 for ok, slow in self.calls if ok and slow) / len(self.calls)
+        if errors >= self.error_rate or slows >= self.slow_rate:
+            self._trip()
+
+    def cancelled(self, latency: float) -> None:
+        """ Records a hedged request that lost the race, only its slowness is known """
+        if latency >= self.slow_seconds:
+            self.record(True, latency)
+        else:
+            self.trial_in_flight = False
+
+    def _trip(self) -> None:
+        print(f"[!] Circuit breaker opened for {self.cooldown:.0f}s")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.calls.clear()
+
+class Backend:
+    def __init__(self, provider: Provider) -> None:
+        self.provider = provider
+        self.name = f"{provider.name}:{provider.model}"
+        self.breaker = CircuitBreaker()
+        # Recent (time to first token, observed) for the hedge deadline, cancelled requests aren't observed
+        self.first_token = deque(maxlen=int(getenv("HEDGE_WINDOW", "100")))
+
+class RoutedStream:
+    """ A response stream that has already produced its first token on `backend` """
+
+    def __init__(self, backend: Backend, agen, first: str, latency: float) -> None:
+        self.backend = backend
+        self.agen = agen
+        self.first = first
+        self.latency = latency
+
+    async def __aiter__(self):
+        try:
+            if self.first:
+                yield self.first
+            async for chunk in self.agen:
+                yield chunk
+        except ProviderError:
+            self.backend.breaker.record(False, self.latency)
+            raise
+        else:
+            self.backend.breaker.record(True, self.latency)
+        finally:
+            await self.agen.aclose()
+
+    async def text(self) -> str:
+        return "".join([chunk async for chunk in self])
+
+async def _first_chunk(agen) -> str:
+    # Returning out of the loop leaves the generator open for the rest of the response
+    async for chunk in agen:
+        return chunk
+    return ""
+
+class Router:
+    def __init__(self, backends: list[Backend]) -> None:
+        if not backends:
+            raise ValueError("At least one backend is required")
+        self.backends = backends
+        self.hedge_percentile = float(getenv("HEDGE_PERCENTILE", "95"))
+        self.hedge_deadline_default = float(getenv("HEDGE_DEADLINE", "2"))
+        self.hedge_min_samples = int(getenv("HEDGE_MIN_SAMPLES", "20"))
+
+    @classmethod
+    def from_env(cls, provider: str, model: str | None = None) -> "Router":
+        """
+        Builds the router from BACKENDS, a comma separated list of provider or provider:model
+        (e.g. "ollama:gemma3:1b-it-qat,google:gemma-3-27b-it") in order of preference.
+        Falls back to the single PROVIDER/MODEL backend.
+        """
+        spec = getenv("BACKENDS")
+        if not spec:
+            return cls([Backend(get_provider(provider, model))])
+
+        backends = []
+        for entry in spec.split(","):
+            name, _, backend_model = entry.strip().partition(":")
+            backends.append(Backend(get_provider(name, backend_model or None)))
+        return cls(backends)
+
+    def hedge_deadline(self, backend: Backend) -> float:
+        if len(backend.first_token) < self.hedge_min_samples:
+            return self.hedge_deadline_default
+        return percentile(backend.first_token, self.hedge_percentile)
+
+    def candidates(self) -> list[Backend]:
+        available = [backend for backend in self.backends if backend.breaker.available()]
+        # With every breaker open, trying anyway beats failing outright
+        return available or list(self.backends)
+
+    async def stream(self, messages: list) -> RoutedStream:
+        """ Returns a stream from whichever backend produces a first token first """
+        queue = self.candidates()
+        attempts = {}
+        errors = []
+
+        def launch() -> tuple:
+            backend = queue.pop(0)
+            backend.breaker.start()
+            agen = backend.provider.stream(messages)
+            task = asyncio.ensure_future(_first_chunk(agen))
+            attempts[task] = (backend, agen, time.monotonic())
+            return attempts[task]
+
+        primary = launch()
+        hedged = False
+
+        try:
+            while attempts:
+                timeout = None
+                if not hedged and queue:
+                    elapsed = time.monotonic() - primary[2]
+                    timeout = max(0.0, self.hedge_deadline(primary[0]) - elapsed)
+
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"[⏱] {primary[0].name} has no first token after {timeout:.2f}s, hedging")
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    backend, agen, started = attempts.pop(task)
+                    latency = time.monotonic() - started
+                    try:
+                        first = task.result()
+                    except ProviderError as e:
+                        print(f"[!] {backend.name} failed: {e}")
+                        backend.breaker.record(False, latency)
+                        errors.append(f"{backend.name}: {e}")
+                        await agen.aclose()
+                        continue
+
+                    backend.first_token.append((latency, True))
+                    await self._cancel(attempts)
+                    return RoutedStream(backend, agen, first, latency)
+
+                # Fail over as soon as nothing is left in flight
+                if not attempts and queue:
+                    primary = launch()
+        except BaseException:
+            await self._cancel(attempts)
+            raise
+
+        raise ProviderError("All backends failed: " + "; ".join(errors))
+
+    async def _cancel(self, attempts: dict) -> None:
+        for task, (backend, agen, started) in list(attempts.items()):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await agen.aclose()
+            elapsed = time.monotonic() - started
+            backend.first_token.append((elapsed, False))
+            backend.breaker.cancelled(elapsed)
+        attempts.clear()
+
+    async def chat(self, messages: list) -> tuple[str, str]:
+        """ Returns the full response text and the name of the backend that produced it """
+        stream = await self.stream(messages)
+        return await stream.text(), stream.backend.name
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Offline stand-ins for the ollama and Google Generative Language APIs and for TTS, so the
+# whole stack can be load tested without provider quota (see `cli loadtest`). One server
+# answers all three, point the API at it with:
+#   OLLAMA_HOST=http://127.0.0.1:11435
+#   GOOGLE_API_HOST=http://127.0.0.1:11435
+#   TTS_URL=http://127.0.0.1:11435/tts
+# Run two with different profiles and list both in BACKENDS to exercise hedging and failover.
+
+PROFILES = {
+    # first_token: median seconds before the first token, jitter: lognormal sigma around it
+    # tokens_per_second: generation speed after the first token, 0 sends everything at once
+    # tokens: mean reply length, parallel: requests generated at once (0 = unlimited), the rest queue
+    # error_rate: fraction of chat requests that fail, tts: median seconds per speech request
+    "instant": {"first_token": 0.0, "jitter": 0.0, "tokens_per_second": 0, "tokens": 20, "parallel": 0, "error_rate": 0.0, "tts": 0.0},
+    "local": {"first_token": 0.3, "jitter": 0.3, "tokens_per_second": 40, "tokens": 120, "parallel": 4, "error_rate": 0.0, "tts": 0.3},
+    "hosted": {"first_token": 0.6, "jitter": 0.5, "tokens_per_second": 120, "tokens": 200, "parallel": 0, "error_rate": 0.005, "tts": 0.4},
+    "degraded": {"first_token": 3.0, "jitter": 0.8, "tokens_per_second": 15, "tokens": 200, "parallel": 2, "error_rate": 0.05, "tts": 1.5},
+}
+
+WORDS = (
+    "the a model answer question voice audio server request token memory speaker transcript "
+    "quickly carefully because however which would could should simple result latency"
+).split()
+
+EMBEDDING_DIMENSIONS = 768
+
+# One silent MPEG-1 layer III frame (128 kbps, 44.1 kHz), about 26 ms of audio
+MP3_FRAME = bytes.fromhex("fffb9064") + bytes(413)
+
+def embedding(text: str) -> list:
+    """ A fixed pseudo random vector per text, so repeated texts embed the same """
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    return [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+
+def build_app(profile: dict) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random()
+    slots = asyncio.Semaphore(int(profile["parallel"])) if profile["parallel"] else None
+
+    def delay(median: float) -> float:
+        if not median:
+            return 0.0
+        return rng.lognormvariate(math.log(median), profile["jitter"])
+
+    def failed() -> bool:
+        return rng.random() < profile["error_rate"]
+
+    async def generate():
+        """ Yields reply tokens at the profile's pace, holding a generation slot throughout """
+        count = max(1, round(rng.gauss(profile["tokens"], profile["tokens"] / 4)))
+        async with slots or contextlib.nullcontext():
+            await asyncio.sleep(delay(profile["first_token"]))
+            for _ in range(count):
+                yield rng.choice(WORDS) + " "
+                if profile["tokens_per_second"]:
+                    await asyncio.sleep(1 / profile["tokens_per_second"])
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        model = body.get("model")
+        if failed():
+            return JSONResponse({"error": "stub failure"}, status_code=500)
+
+        if body.get("stream", True):
+            async def lines():
+                async for token in generate():
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        text = "".join([token async for token in generate()])
+        return {"model": model, "message": {"role": "assistant", "content": text}, "done": True}
+
+    @app.post("/api/embed")
+    async def ollama_embed(request: Request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {"model": body.get("model"), "embeddings": [embedding(text) for text in texts]}
+
+    @app.post("/v1beta/models/{target}")
+    async def google(target: str, request: Request):
+        body = await request.json()
+        _, _, method = target.partition(":")
+
+        if method == "batchEmbedContents":
+            return {"embeddings": [{"values": embedding(item["content"]["parts"][0]["text"])} for item in body["requests"]]}
+        if method not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}"}}, status_code=404)
+        if failed():
+            return JSONResponse({"error": {"code": 503, "message": "stub failure", "status": "UNAVAILABLE"}}, status_code=503)
+
+        def candidate(text: str) -> dict:
+            return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+        if method == "streamGenerateContent":
+            async def events():
+                async for token in generate():
+                    yield f"data: {json.dumps(candidate(token))}\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return candidate("".join([token async for token in generate()]))
+
+    @app.post("/tts")
+    async def tts(request: Request):
+        body = await request.json()
+        await asyncio.sleep(delay(profile["tts"]))
+        # Roughly the length the text would take to speak, about 15 characters a second
+        frames = max(1, round(len(body.get("text", "")) / 15 / 0.026))
+        return Response(MP3_FRAME * frames, media_type="audio/mpeg")
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline ollama, Google and TTS stand-ins for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--profile", choices=PROFILES, default="local")
+    for key in PROFILES["local"]:
+        # Each profile setting can be overridden, e.g. --tokens-per-second 80
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=None)
+    args = parser.parse_args()
+
+    profile = dict(PROFILES[args.profile])
+    profile.update({key: getattr(args, key) for key in profile if getattr(args, key) is not None})
+    print(f"[✔] Stub providers ({args.profile}: {profile}) on http://{args.host}:{args.port}")
+    uvicorn.run(build_app(profile), host=args.host, port=args.port, log_level="warning")
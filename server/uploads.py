@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import uuid
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+# .env
+from dotenv import load_dotenv
+from os.path import dirname, join
+from os import getenv
+
+load_dotenv(join(dirname(__file__), ".env"))
+
+# Formats the audio module can decode, flac and opus are what the CLI sends with --compress
+AUDIO_FORMATS = ("mp3", "wav", "flac", "opus", "ogg")
+
+MAX_UPLOAD_BYTES = int(float(getenv("MAX_UPLOAD_MB", "500")) * 1024 * 1024)
+MAX_AUDIO_SECONDS = float(getenv("MAX_AUDIO_SECONDS", "14400"))
+# The duration is probed once this much of the audio has arrived, enough for the header
+# even behind cover art in an mp3's ID3 tag
+UPLOAD_PROBE_BYTES = int(getenv("UPLOAD_PROBE_BYTES", str(2 * 1024 * 1024)))
+UPLOAD_DIR = getenv("UPLOAD_DIR", "/tmp")
+# Text fields sent along with the audio (e.g. token) are small
+MAX_FIELD_BYTES = 64 * 1024
+FFPROBE = "ffprobe"
+
+class UploadLimitMiddleware:
+    """
+    Rejects request bodies larger than max_bytes with 413.
+    A declared Content-Length is checked before reading anything, chunked bodies are
+    counted as they arrive and cut off as soon as they pass the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": "Upload too large"}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def delete_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def audio_duration(path: str, total_bytes: int | None = None) -> float:
+    """
+    Duration in seconds from the header (ffprobe), without decoding, of a file that may still be
+    arriving. wav, flac and VBR mp3 headers carry the full length, for the rest total_bytes at the
+    stream's bitrate gives it.
+    """
+    result = subprocess.run(
+        [FFPROBE, "-v", "error", "-show_entries", "format=duration:stream=duration,bit_rate", "-of", "json", path],
+        capture_output=True,
+    )
+    try:
+        info = json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return 0.0
+    stream = (info.get("streams") or [{}])[0]
+    seconds = [_number(stream.get("duration")), _number(info.get("format", {}).get("duration"))]
+    bit_rate = _number(stream.get("bit_rate"))
+    if total_bytes and bit_rate:
+        seconds.append(total_bytes * 8 / bit_rate)
+    return max(seconds)
+
+async def check_duration(path: str, total_bytes: int | None = None) -> None:
+    duration = await run_in_threadpool(audio_duration, path, total_bytes)
+    if duration > MAX_AUDIO_SECONDS:
+        raise HTTPException(status_code=413, detail=f"Audio is {duration:.0f}s, the limit is {MAX_AUDIO_SECONDS:.0f}s")
+
+class _Form:
+    """ python-multipart callbacks: the "file" part is written and hashed as it arrives, other parts kept as text fields """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.fields = {}
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.ext = None
+        self.part_path = None
+        self.complete = False
+        self._file = None
+        self._field = None
+        self._value = None
+        self._headers = {}
+        self._header_name = b""
+        self._header_value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        if name != "file" or self.part_path is not None:
+            self._field, self._value = name, bytearray()
+            return
+
+        filename = options.get(b"filename", b"").decode("utf-8", errors="replace")
+        self.ext = filename.split(".")[-1].lower()
+        if self.ext not in AUDIO_FORMATS:
+            raise HTTPException(status_code=400, detail="Unsupported audio format")
+        fd, self.part_path = tempfile.mkstemp(dir=self.directory, suffix=f".{self.ext}.part")
+        self._file = os.fdopen(fd, "wb")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        chunk = data[start:end]
+        if self._file is not None:
+            self.size += len(chunk)
+            if self.size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Upload too large")
+            self.digest.update(chunk)
+            self._file.write(chunk)
+        elif self._value is not None:
+            self._value += chunk
+            if len(self._value) > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field {self._field} too large")
+
+    def _on_part_end(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self.complete = True
+        elif self._value is not None:
+            self.fields[self._field] = self._value.decode("utf-8", errors="replace")
+            self._field = self._value = None
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self.part_path is not None:
+            delete_file(self.part_path)
+
+async def save_upload(request: Request, directory: str = UPLOAD_DIR) -> tuple[str, dict]:
+    """
+    Streams a multipart upload from the request body into directory, hashing the "file" part as it
+    arrives: nothing is spooled or copied on the way. Returns its path and the other form fields.
+    The path is the content hash plus a per request suffix: identical uploads in flight at the same
+    time must not share a file, every route deletes its copy (and wav) when done.
+
+    Once UPLOAD_PROBE_BYTES of audio have arrived its header is probed, so recordings longer than
+    MAX_AUDIO_SECONDS are refused with 413 before the rest is received. The whole file is probed
+    again at the end for formats whose header doesn't tell. Raises 400 for unsupported formats.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    length = request.headers.get("content-length", "")
+    total_bytes = int(length) if length.isdigit() else None
+
+    form = _Form(directory)
+    parser = MultipartParser(boundary, form.callbacks())
+    probed = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if not probed and form.size >= UPLOAD_PROBE_BYTES:
+                probed = True
+                form.flush()
+                await check_duration(form.part_path, total_bytes)
+        parser.finalize()
+        if not form.complete:
+            raise HTTPException(status_code=400, detail="No audio file in the upload")
+
+        path = join(directory, f"{form.digest.hexdigest()}-{uuid.uuid4().hex[:12]}.{form.ext}")
+        os.replace(form.part_path, path)
+    except MultipartParseError as e:
+        form.discard()
+        raise HTTPException(status_code=400, detail="Malformed multipart body") from e
+    except BaseException:
+        form.discard()
+        raise
+
+    try:
+        await check_duration(path)
+    except BaseException:
+        delete_file(path)
+        raise
+    return path, form.fields